@@ -0,0 +1,87 @@
+"""
+Micro-benchmark du decompte des exports CSV Framadate sur un export synthetique de 100 joueurs x 60 creneaux.
+Compare l'ancienne analyse (texte complet, StringIO, dictionnaires de tuples, strip().lower() sur chaque cellule)
+au decompte en une passe de ExportTally, alimente ligne par ligne, qui produit la matrice de disponibilites classee
+ensuite par SlotScorer.
+
+Usage : python -m benchmarks.bench_framadate_tally
+"""
+import csv
+import random
+import timeit
+from io import StringIO
+
+from cogs.apis.framadate_tally import ExportTally
+
+
+PLAYERS = 100
+SLOTS = 60
+REPEAT = 5
+NUMBER = 50
+
+
+def build_export(players=PLAYERS, slots=SLOTS, seed=42):
+    """
+    Construit un export au format de exportcsv.php : champs entre guillemets suivis d'une virgule, premier champ
+    des en-tetes vide et sans guillemets.
+    """
+    rng = random.Random(seed)
+
+    def row(first, cells):
+        return first + ''.join(f'"{cell}",' for cell in cells) + '\r\n'
+
+    lines = [row(',', [f'{(i // 3) + 1:02d}/10/2026' for i in range(slots)]),
+             row(',', [("Après-midi", "Fin d'aprem", "Soir")[i % 3] for i in range(slots)])]
+    for p in range(players):
+        lines.append(row(f'"Joueur {p}",', [rng.choice(('Oui', 'Non', 'Si nécessaire', '')) for _ in range(slots)]))
+    return ''.join(lines).encode('utf-8')
+
+
+def legacy_analyze(content, players_count):
+    f = StringIO(content.decode('utf-8'))
+    reader = csv.reader(f, delimiter=',')
+    date_headers = next(reader)[1:]
+    time_headers = next(reader)[1:]
+    slots = list(zip(date_headers, time_headers))
+    slot_yes_responses = {slot: 0 for slot in slots}
+    slot_if_needed_responses = {slot: 0 for slot in slots}
+    non_responders = []
+    for row in reader:
+        is_non_responder = True
+        for i, resp in enumerate(row[1:], start=1):
+            formatted_response = resp.strip().lower()
+            if formatted_response == 'oui':
+                slot_yes_responses[slots[i - 1]] += 1
+                is_non_responder = False
+            elif formatted_response == 'si nécessaire':
+                slot_if_needed_responses[slots[i - 1]] += 1
+                is_non_responder = False
+        if is_non_responder:
+            non_responders.append(row[0])
+    date_found = None
+    max_yes_responses = 0
+    for slot, yes_count in slot_yes_responses.items():
+        if yes_count > max_yes_responses and yes_count + slot_if_needed_responses[slot] == players_count:
+            date_found = f"{slot[0]} {slot[1]}"
+            max_yes_responses = yes_count
+    return {"non_responders": non_responders, "date_found": date_found, "all_responded": not non_responders}
+
+
+def tally_analyze(content, players_count):
+    tally = ExportTally()
+    for line in content.splitlines(keepends=True):
+        tally.feed_line(line.decode('utf-8'))
+    return tally.summary()
+
+
+def main():
+    content = build_export()
+    assert legacy_analyze(content, PLAYERS)['non_responders'] == tally_analyze(content, PLAYERS)['non_responders']
+
+    for name, func in (('legacy', legacy_analyze), ('tally', tally_analyze)):
+        best = min(timeit.repeat(lambda: func(content, PLAYERS), repeat=REPEAT, number=NUMBER)) / NUMBER
+        print(f'{name:>8}: {best * 1000:.3f} ms per export ({PLAYERS} players x {SLOTS} slots)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,17 @@
+import io
+import csv
+import time
+import asyncio
 import logging
 import requests
 import aiohttp
-import csv
-from io import StringIO
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
 
+from cogs.apis.framadate_cache import ExportCache
+from cogs.apis.framadate_tally import ExportTally
+from cogs.services.slot_scoring import SlotScorer
+
 
 logger = logging.getLogger(__name__)
 
@@ -22,8 +28,20 @@ class FramadateAPI(object):
     HTTP_ERROR_MESSAGE = "Une erreur {} s'est produite lors de la requête HTTP à l'URL {}"
     API_ERROR_MESSAGE = "Une erreur s'est produite lors de l'appel à l'API à l'URL {}: {}"
 
-    def __init__(self):
+    CREATION_RETRIES = 3
+    CREATION_RETRY_DELAY = 1  # secondes, doublé à chaque nouvelle tentative
+    CREATION_STEP_TIMEOUT = 20  # secondes
+    REGISTRATION_CONCURRENCY = 5
+    REGISTRATION_RETRIES = 3
+
+    def __init__(self, http_session=None):
+        """
+        :param http_session: Session HTTP asynchrone partagee (PooledHTTPSession) utilisee par les appels asynchrones
+        """
         self.session = requests.Session()
+        self.http = http_session
+        self.exports = ExportCache()
+        self.scorer = SlotScorer()
         logger.info("FramadateAPI initialized.")
 
     def handle_http_errors(self, response):
@@ -106,15 +124,14 @@ class FramadateAPI(object):
             logger.warning("No control token found.")
         return control_token
 
-    @staticmethod
-    async def add_player(admin_url, player_name, control_token, choices):
+    async def add_player(self, admin_url, player_name, control_token, choices):
         """
         Ajoute un joueur au sondage afin de permettre de tracker les votes des différents joueurs
         :param admin_url: URL de l'administration du sondage
         :param player_name: Nom du joueur
         :param control_token: Token de controle du sondage
         :param choices: Choix du joueur
-        :return:
+        :return: True si le joueur a ete ajoute, False sinon
         """
         data = {
             'control': control_token,
@@ -124,93 +141,151 @@ class FramadateAPI(object):
         data.update(choices)
 
         logger.info(f"Adding player {player_name} to poll at {admin_url}.")
-        async with aiohttp.ClientSession() as session:
-            await session.post(admin_url, data=data)
+        async with self.http.post(admin_url, data=data) as response:
+            try:
+                self.handle_http_errors(response)
+            except aiohttp.ClientResponseError:
+                return False
         logger.info(f"Player {player_name} added successfully.")
+        return True
 
-    async def analyze_csv(self, admin_url, players_count):
+    async def registered_players(self, admin_url):
+        """
+        Recupere les noms des joueurs deja inscrits au sondage, a partir de son export CSV.
+        :param admin_url: URL de l'administration du sondage
+        :return: Ensemble des noms des joueurs, ou None si l'export n'a pas pu etre lu
+        """
+        csv_url = f"{self.BASE_URL}{self.EXPORT_ENDPOINT}?admin={self.get_poll_id(admin_url)}"
+        try:
+            async with self.http.get(csv_url) as response:
+                self.handle_http_errors(response)
+                text = await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Failed to read the players of poll {admin_url}: {e!r}")
+            return None
+        return {row[0] for row in list(csv.reader(io.StringIO(text)))[2:] if row}
+
+    async def add_players(self, admin_url, players, control_token, choices):
+        """
+        Ajoute tous les joueurs au sondage en parallele, sur la session partagee. Chaque ligne est relancee en cas
+        d'echec, et le nombre d'ajouts simultanes est limite. L'ajout n'etant pas idempotent, une requete qui a pu
+        atteindre le serveur (timeout, connexion coupee) n'est relancee qu'apres avoir verifie dans l'export que le
+        joueur n'a pas ete inscrit.
+        :param admin_url: URL de l'administration du sondage
+        :param players: Noms des joueurs
+        :param control_token: Token de controle du sondage
+        :param choices: Choix par defaut des joueurs
+        :return: Dictionnaire contenant les joueurs ajoutes, ceux en echec et la duree de l'operation en secondes
+        """
+        semaphore = asyncio.Semaphore(self.REGISTRATION_CONCURRENCY)
+
+        async def register(player_name):
+            async with semaphore:
+                for attempt in range(1, self.REGISTRATION_RETRIES + 1):
+                    try:
+                        if await self.add_player(admin_url, player_name, control_token, choices):
+                            return True
+                    except aiohttp.ClientConnectorError as e:
+                        logger.warning(f"Failed to add player {player_name} "
+                                       f"(attempt {attempt}/{self.REGISTRATION_RETRIES}): {e!r}")
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        logger.warning(f"Failed to add player {player_name} "
+                                       f"(attempt {attempt}/{self.REGISTRATION_RETRIES}): {e!r}")
+                        registered = await self.registered_players(admin_url)
+                        if registered is None:
+                            return False
+                        if player_name in registered:
+                            logger.info(f"Player {player_name} was added despite the error.")
+                            return True
+                    if attempt < self.REGISTRATION_RETRIES:
+                        await asyncio.sleep(self.CREATION_RETRY_DELAY * 2 ** (attempt - 1))
+                return False
+
+        started_at = time.monotonic()
+        results = await asyncio.gather(*(register(player) for player in players))
+        elapsed = time.monotonic() - started_at
+
+        registered = [player for player, added in zip(players, results) if added]
+        failed = [player for player, added in zip(players, results) if not added]
+        logger.info(f"Registered {len(registered)}/{len(players)} players on {admin_url} in {elapsed:.2f}s.")
+        return {
+            'registered': registered,
+            'failed': failed,
+            'elapsed': elapsed
+        }
+
+    @staticmethod
+    def get_poll_id(admin_url):
+        return admin_url.split('/')[-2]
+
+    async def analyze_csv(self, admin_url, players_count, required=()):
         """
         Analyse le fichier CSV du sondage et retourne les votants n'ayant pas répondu, la date choisie et
         si tout le monde a répondu.
-        Selectionne la date avec le plus de votes positifs, et si plusieurs dates ont le même nombre de votes positifs,
-        selectionne la date avec le moins de votes "si nécessaire".
+        Les créneaux sont classés par SlotScorer : la date choisie est la meilleure, les suivantes sont proposées
+        comme dates de repli ('alternatives').
+        L'export est demandé de façon conditionnelle, et son empreinte est calculée ligne par ligne au fil de la
+        réponse : s'il n'a pas changé depuis la dernière analyse, celle-ci est retournée telle quelle, sans décompte.
+        Sinon, les lignes lues sont décomptées en une passe.
         :param admin_url: URL de l'administration du sondage
         :param players_count: Nombre de joueurs
-        :return: Dictionnaire contenant les votants n'ayant pas répondu, la date choisie et si tout le monde a répondu,
-        ou None si une erreur s'est produite
+        :param required: Joueurs devant obligatoirement être disponibles à la date choisie (le MJ)
+        :return: Dictionnaire contenant les votants n'ayant pas répondu, la date choisie, les dates de repli,
+        si tout le monde a répondu, les créneaux ('slots'), la matrice de disponibilités par joueur ('availability'), si l'export a changé
+        ('changed') et les votes modifiés par joueur ('vote_delta'), ou None si une erreur s'est produite
         """
-        poll_id = admin_url.split('/')[-2]
-        csv_url = f"{self.BASE_URL}/exportcsv.php?admin={poll_id}"
+        poll_id = self.get_poll_id(admin_url)
+        csv_url = f"{self.BASE_URL}{self.EXPORT_ENDPOINT}?admin={poll_id}"
 
         logger.info(f"Analyzing CSV data for poll ID {poll_id}.")
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(csv_url) as response:
-                try:
-                    self.handle_http_errors(response)
-                except (requests.HTTPError, requests.RequestException):
-                    return None
-
-                csv_text = await response.text()
-                f = StringIO(csv_text)
-                reader = csv.reader(f, delimiter=',')
-
-                date_headers = next(reader)[1:]
-                time_headers = next(reader)[1:]
-
-                slots = list(zip(date_headers, time_headers))
-                slot_yes_responses = {slot: 0 for slot in slots}
-                slot_if_needed_responses = {slot: 0 for slot in slots}
-                non_responders = []
-
-                for row in reader:
-                    attendee_name = row[0]
-                    responses = row[1:]
-                    is_non_responder = True
-
-                    for i, resp in enumerate(responses, start=1):
-                        formatted_response = resp.strip().lower()
-                        if formatted_response == 'oui':
-                            slot_yes_responses[slots[i - 1]] += 1
-                            is_non_responder = False
-                        elif formatted_response == 'si nécessaire':
-                            slot_if_needed_responses[slots[i - 1]] += 1
-                            is_non_responder = False
-
-                    if is_non_responder:
-                        non_responders.append(attendee_name)
-
-                f.close()
-
-                date_found = None
-                max_yes_responses = 0
-                for slot, yes_count in slot_yes_responses.items():
-                    if_needed_count = slot_if_needed_responses[slot]
-                    total_count = yes_count + if_needed_count
-
-                    if yes_count > max_yes_responses and total_count == players_count:
-                        date_found = f"{slot[0]} {slot[1]}"
-                        max_yes_responses = yes_count
-
-                all_responded = not non_responders
-
-                logger.info(f"CSV analysis complete. Date found: {date_found}, All responded: {all_responded}")
-                return {
-                    "non_responders": non_responders,
-                    "date_found": date_found,
-                    "all_responded": all_responded
-                }
+        async with self.http.get(csv_url, headers=self.exports.conditional_headers(poll_id)) as response:
+            if response.status == 304:
+                cached = self.exports.cached_analysis(poll_id, players_count)
+                if cached:
+                    return cached
+            try:
+                self.handle_http_errors(response)
+            except aiohttp.ClientResponseError:
+                return None
+
+            encoding = response.charset or 'utf-8'
+            hasher = self.exports.hasher()
+            lines = []
+            async for line in response.content:
+                hasher.update(line)
+                lines.append(line)
+
+            digest = hasher.hexdigest()
+            cached = self.exports.cached_analysis(poll_id, players_count, digest)
+            if cached:
+                return cached
+
+            tally = ExportTally()
+            for line in lines:
+                tally.feed_line(line.decode(encoding))
+
+            analysis = tally.summary()
+            ranked = self.scorer.rank(analysis['availability'], analysis['slots'], players_count, required)
+            analysis['date_found'] = ranked[0]['slot'] if ranked else None
+            analysis['alternatives'] = [slot['slot'] for slot in ranked[1:]]
+            logger.info(f"CSV analysis complete. Date found: {analysis['date_found']}, "
+                        f"All responded: {analysis['all_responded']}")
+            return self.exports.store(poll_id, players_count, response.headers, digest, analysis)
+
+    def forget_poll(self, admin_url):
+        """
+        Oublie le dernier export d'un sondage qui n'est plus suivi
+        :param admin_url: URL de l'administration du sondage
+        :return:
+        """
+        self.exports.forget(self.get_poll_id(admin_url))
 
-    def initiate_poll(self, poll_author, poll_type='date', lang='fr', title='', description='', email=''):
+    @staticmethod
+    def get_initiation_form(poll_author, poll_type, lang, title, description, email):
         """
-        Initialise un sondage Framadate et retourne la page de creation. Premiere etape de la creation du sondage
-        :param poll_author: Auteur du sondage
-        :param poll_type: Type de sondage (date, classic)
-        :param lang: Langue du sondage (fr, en, es, de, it, pt, ru, zh)
-        :param title: Titre du sondage
-        :param description: Description du sondage
-        :param email: Email de l'auteur
-        :return: True si le sondage a ete initialise avec succes, False sinon
+        Construit les parametres et le formulaire de la premiere etape de la creation du sondage
+        :return: Tuple (parametres de l'URL, donnees du formulaire)
         """
         params = {'type': poll_type, 'lang': lang}
         data = {
@@ -226,6 +301,20 @@ class FramadateAPI(object):
             'type': poll_type,
             'gotostep2': poll_type,
         }
+        return params, data
+
+    def initiate_poll(self, poll_author, poll_type='date', lang='fr', title='', description='', email=''):
+        """
+        Initialise un sondage Framadate et retourne la page de creation. Premiere etape de la creation du sondage
+        :param poll_author: Auteur du sondage
+        :param poll_type: Type de sondage (date, classic)
+        :param lang: Langue du sondage (fr, en, es, de, it, pt, ru, zh)
+        :param title: Titre du sondage
+        :param description: Description du sondage
+        :param email: Email de l'auteur
+        :return: True si le sondage a ete initialise avec succes, False sinon
+        """
+        params, data = self.get_initiation_form(poll_author, poll_type, lang, title, description, email)
         logging.info(f"Initiating poll '{title}' by {poll_author} ({poll_type}, {lang}).")
         response = self.session.post(self.BASE_URL + self.CREATION_ENDPOINT, params=params, data=data)
         try:
@@ -300,8 +389,18 @@ class FramadateAPI(object):
             logging.error("Failed to confirm poll.")
             return None
 
-        admin_url = response.url
-        html = response.content
+        return self.build_poll_result(response.url, response.content, date_entries, num_days, end_date)
+
+    def build_poll_result(self, admin_url, html, date_entries, num_days, end_date):
+        """
+        Extrait de la page d'administration les informations necessaires pour administrer le sondage
+        :param admin_url: URL de la page d'administration du sondage
+        :param html: HTML de la page d'administration du sondage
+        :param date_entries: Dates envoyees lors de la seconde etape de la creation
+        :param num_days: Nombre de jours planifies
+        :param end_date: Date de fin du sondage au format dd/mm/yyyy
+        :return: Dictionnaire contenant les informations du sondage
+        """
         public_url = self.get_public_poll_link(html)
         control_token = self.get_control_token(html)
         choices_count = len(date_entries) - 1 - num_days
@@ -309,9 +408,99 @@ class FramadateAPI(object):
         logging.info("Poll created successfully with public URL and control token.")
 
         return {
-            'admin_url': admin_url,
+            'admin_url': str(admin_url),
             'public_url': public_url,
             'choices_count': choices_count,
             'control_token': control_token,
             'expire_at': end_date
-        }
\ No newline at end of file
+        }
+
+    async def post_with_retry(self, session, url, step, **kwargs):
+        """
+        Envoie une requete POST d'une etape de creation, relancee en cas d'erreur reseau, de timeout ou
+        d'erreur serveur (5xx)
+        :param session: Session aiohttp portant les cookies de la creation en cours
+        :param url: URL de l'etape
+        :param step: Nom de l'etape, pour les logs
+        :return: Tuple (URL finale, contenu de la reponse), ou None si l'etape a echoue
+        """
+        timeout = aiohttp.ClientTimeout(total=self.CREATION_STEP_TIMEOUT)
+        for attempt in range(1, self.CREATION_RETRIES + 1):
+            try:
+                async with session.post(url, timeout=timeout, **kwargs) as response:
+                    self.handle_http_errors(response)
+                    return response.url, await response.read()
+            except aiohttp.ClientResponseError as e:
+                if e.status < 500:
+                    logging.error(f"Poll creation step '{step}' rejected with status {e.status}.")
+                    return None
+                error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+            logging.warning(f"Poll creation step '{step}' failed (attempt {attempt}/{self.CREATION_RETRIES}): "
+                            f"{error!r}")
+            if attempt < self.CREATION_RETRIES:
+                await asyncio.sleep(self.CREATION_RETRY_DELAY * 2 ** (attempt - 1))
+        return None
+
+    async def initiate_poll_async(self, session, poll_author, poll_type='date', lang='fr', title='', description='',
+                                  email=''):
+        """
+        Version asynchrone de initiate_poll. Premiere etape de la creation du sondage
+        :param session: Session aiohttp portant les cookies de la creation en cours
+        :return: True si le sondage a ete initialise avec succes, False sinon
+        """
+        params, data = self.get_initiation_form(poll_author, poll_type, lang, title, description, email)
+        logging.info(f"Initiating poll '{title}' by {poll_author} ({poll_type}, {lang}).")
+        result = await self.post_with_retry(session, self.BASE_URL + self.CREATION_ENDPOINT, 'initiate',
+                                            params=params, data=data)
+        return result is not None
+
+    async def set_poll_dates_async(self, session, date_entries):
+        """
+        Version asynchrone de set_poll_dates. Seconde etape de la creation du sondage
+        :param session: Session aiohttp portant les cookies de la creation en cours
+        :param date_entries: Liste des dates au format dd/mm/yyyy
+        :return: True si les dates ont ete ajoutees avec succes, False sinon
+        """
+        logging.info("Setting poll dates.")
+        result = await self.post_with_retry(session, self.BASE_URL + self.DATE_POLL_ENDPOINT, 'set_dates',
+                                            data=date_entries)
+        return result is not None
+
+    async def confirm_poll_async(self, session, end_date):
+        """
+        Version asynchrone de confirm_poll. Troisieme etape de la creation du sondage
+        :param session: Session aiohttp portant les cookies de la creation en cours
+        :param end_date: Date de fin du sondage au format dd/mm/yyyy
+        :return: Tuple (URL d'administration, HTML de la page d'administration), ou None si la confirmation a echoue
+        """
+        logging.info(f"Confirming poll with end date {end_date}.")
+        data = {'enddate': end_date, 'confirmation': 'confirmation'}
+        return await self.post_with_retry(session, self.BASE_URL + self.DATE_POLL_ENDPOINT, 'confirm', data=data)
+
+    async def create_date_poll_async(self, poll_author, title, description, email, start_date, num_days, end_date):
+        """
+        Version asynchrone de create_date_poll, qui ne bloque pas la boucle d'evenements du bot.
+        Les trois etapes partagent une session dediee (cookies) qui reutilise le pool de connexions du bot.
+        :return: Dictionnaire contenant les informations du sondage, ou None si la creation a echoue
+        """
+        logging.info(f"Creating date poll '{title}' by {poll_author}.")
+        async with self.http.cookie_session() as session:
+            if not await self.initiate_poll_async(session, poll_author=poll_author, title=title,
+                                                  description=description, email=email):
+                logging.error("Failed to initiate poll.")
+                return None
+
+            date_entries = self.generate_schedule(start_date, num_days)
+            if not await self.set_poll_dates_async(session, date_entries):
+                logging.error("Failed to set poll dates.")
+                return None
+
+            result = await self.confirm_poll_async(session, end_date)
+            if not result:
+                logging.error("Failed to confirm poll.")
+                return None
+
+        admin_url, html = result
+        return self.build_poll_result(admin_url, html, date_entries, num_days, end_date)
@@ -0,0 +1,107 @@
+import hashlib
+import logging
+
+from cogs.apis.framadate_tally import ExportTally
+
+
+logger = logging.getLogger(__name__)
+
+
+class ExportCache(object):
+    """
+    Cache des derniers exports CSV des sondages Framadate. Pour chaque sondage, conserve l'empreinte du contenu,
+    les en-tetes ETag/Last-Modified eventuels et la derniere analyse (dont la matrice de disponibilites).
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.stats = {'not_modified': 0, 'same_content': 0, 'changed': 0}
+
+    @staticmethod
+    def hasher():
+        return hashlib.sha1()
+
+    def conditional_headers(self, poll_id):
+        """
+        Construit les en-tetes d'une requete conditionnelle a partir du dernier export.
+        :param poll_id: Identifiant du sondage
+        :return: Dictionnaire des en-tetes HTTP
+        """
+        entry = self.entries.get(poll_id)
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def cached_analysis(self, poll_id, players_count, digest=None):
+        """
+        Retourne la derniere analyse si l'export n'a pas change.
+        :param poll_id: Identifiant du sondage
+        :param players_count: Nombre de joueurs attendu
+        :param digest: Empreinte du nouvel export, None si le serveur a repondu 304
+        :return: Analyse precedente sans variation de votes, ou None si l'export a change
+        """
+        entry = self.entries.get(poll_id)
+        if not entry or entry['players_count'] != players_count:
+            return None
+        if digest is None:
+            self.stats['not_modified'] += 1
+        elif digest == entry['digest']:
+            self.stats['same_content'] += 1
+        else:
+            return None
+        logger.info(f"Export of poll {poll_id} unchanged, reusing previous analysis.")
+        return dict(entry['analysis'], changed=False, vote_delta={})
+
+    def store(self, poll_id, players_count, response_headers, digest, analysis):
+        """
+        Enregistre un nouvel export et calcule les votes modifies depuis le precedent.
+        :param poll_id: Identifiant du sondage
+        :param players_count: Nombre de joueurs attendu
+        :param response_headers: En-tetes de la reponse HTTP
+        :param digest: Empreinte de l'export
+        :param analysis: Resultat de l'analyse de l'export, avec 'slots' et 'availability'
+        :return: Analyse completee par 'changed' et 'vote_delta'
+        """
+        previous = self.entries.get(poll_id)
+        vote_delta = self.vote_delta(previous['analysis']['availability'] if previous else {},
+                                     analysis['availability'], analysis['slots'])
+        self.entries[poll_id] = {
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+            'digest': digest,
+            'players_count': players_count,
+            'analysis': analysis,
+        }
+        self.stats['changed'] += 1
+        if vote_delta:
+            logger.info(f"Votes changed on poll {poll_id}: {vote_delta}")
+        return dict(analysis, changed=True, vote_delta=vote_delta)
+
+    @staticmethod
+    def vote_delta(previous_availability, availability, slots):
+        """
+        Compare les reponses de deux exports.
+        :param previous_availability: Reponses du precedent export, {joueur: codes des reponses par creneau}
+        :param availability: Reponses du nouvel export
+        :param slots: Libelles des creneaux
+        :return: Dictionnaire {joueur: [(creneau, ancienne reponse, nouvelle reponse), ...]}
+        """
+        labels = ExportTally.ANSWER_LABELS
+        delta = {}
+        for player, codes in availability.items():
+            previous_codes = previous_availability.get(player)
+            if previous_codes == codes:
+                continue
+            previous_codes = previous_codes or bytes(len(codes))
+            changes = [(slot, labels[old], labels[new])
+                       for slot, old, new in zip(slots, previous_codes, codes) if old != new]
+            if changes:
+                delta[player] = changes
+        return delta
+
+    def forget(self, poll_id):
+        self.entries.pop(poll_id, None)
@@ -0,0 +1,112 @@
+import csv
+import logging
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCodes(dict):
+    """
+    Table des codes de reponse : les libelles exacts sont trouves directement, les autres sont normalises.
+    """
+    def __missing__(self, answer):
+        return self.get(answer.strip().lower(), ExportTally.NO_ANSWER)
+
+
+class ExportTally(object):
+    """
+    Decompte en une seule passe des reponses d'un export CSV Framadate, alimente ligne par ligne. Les reponses de
+    chaque joueur sont codees dans une ligne de la matrice de disponibilites, classee ensuite par SlotScorer.
+    """
+    NO_ANSWER = 0
+    NO = 1
+    IF_NEEDED = 2
+    YES = 3
+    ANSWER_LABELS = ('', 'non', 'si nécessaire', 'oui')
+    ANSWER_CODES = AnswerCodes({
+        '': NO_ANSWER,
+        'oui': YES, 'Oui': YES,
+        'non': NO, 'Non': NO,
+        'si nécessaire': IF_NEEDED, 'Si nécessaire': IF_NEEDED,
+    })
+
+    def __init__(self):
+        self.date_headers = None
+        self.slots = None
+        self.availability = {}
+        self.non_responders = []
+        self._lines = deque()
+        self._quotes = 0
+        self._reader = csv.reader(self._next_line(), delimiter=',')
+
+    def _next_line(self):
+        while True:
+            yield self._lines.popleft()
+
+    def feed_line(self, line):
+        """
+        Ajoute une ligne brute de l'export. Les lignes simples (sans guillemets, ou dont tous les champs sont entre
+        guillemets comme dans les exports Framadate, avec leur virgule finale et le premier champ vide des en-tetes)
+        sont decoupees directement ; les autres passent par le module csv, et une ligne dont un champ entre
+        guillemets se poursuit sur la ligne suivante est conservee jusqu'a ce que le champ soit ferme.
+        :param line: Ligne de l'export, fin de ligne comprise
+        :return:
+        """
+        if not self._lines:
+            text = line.rstrip('\r\n')
+            if not text.strip():
+                return
+            quotes = text.count('"')
+            if not quotes:
+                return self.feed_row(text.split(','))
+            quoted = text[text.startswith(',"'):len(text) - text.endswith('",')]
+            if quoted[0] == '"' and quoted[-1] == '"' and quotes == 2 + 2 * quoted.count('","'):
+                row = quoted[1:-1].split('","')
+                return self.feed_row([''] + row if text[0] == ',' else row)
+
+        self._lines.append(line)
+        self._quotes += line.count('"')
+        if self._quotes % 2:
+            return
+        self._quotes = 0
+        self.feed_row(next(self._reader))
+
+    def feed_row(self, row):
+        """
+        Ajoute une ligne deja decoupee de l'export : les deux premieres sont les en-tetes (dates puis horaires),
+        les suivantes les reponses des joueurs. Les creneaux absents d'une ligne trop courte sont sans reponse.
+        :param row: Liste des cellules de la ligne
+        :return:
+        """
+        if self.date_headers is None:
+            self.date_headers = row[1:]
+            while self.date_headers and not self.date_headers[-1]:
+                self.date_headers.pop()
+            return
+        if self.slots is None:
+            self.slots = [f"{date} {hour}" for date, hour in zip(self.date_headers, row[1:])]
+            return
+
+        codes = bytes(map(self.ANSWER_CODES.__getitem__, row[1:len(self.slots) + 1]))
+        codes += bytes([self.NO_ANSWER]) * (len(self.slots) - len(codes))
+
+        self.availability[row[0]] = codes
+        if self.YES not in codes and self.IF_NEEDED not in codes:
+            self.non_responders.append(row[0])
+
+    def summary(self):
+        """
+        Termine la lecture de l'export et retourne ce dont le classement des creneaux a besoin.
+        :return: Dictionnaire contenant les votants n'ayant pas répondu, si tout le monde a répondu, les créneaux
+        ('slots') et la matrice de disponibilités par joueur ('availability')
+        """
+        if self._lines:
+            self.feed_row(next(csv.reader(list(self._lines), delimiter=',')))
+            self._lines.clear()
+        return {
+            "non_responders": self.non_responders,
+            "all_responded": not self.non_responders,
+            "slots": self.slots or [],
+            "availability": self.availability,
+        }
@@ -0,0 +1,100 @@
+import logging
+import aiohttp
+
+
+logger = logging.getLogger(__name__)
+
+
+class PooledHTTPSession(object):
+    """
+    Session HTTP asynchrone partagee par tout le bot. Les connexions sont conservees (keep-alive) et reutilisees
+    d'une requete a l'autre, les resolutions DNS sont mises en cache et chaque requete est bornee dans le temps.
+    """
+    LIMIT = 100
+    LIMIT_PER_HOST = 10
+    DNS_CACHE_TTL = 300  # secondes
+    KEEPALIVE_TIMEOUT = 60  # secondes
+    TOTAL_TIMEOUT = 30  # secondes
+    CONNECT_TIMEOUT = 10  # secondes
+
+    def __init__(self):
+        self.connector = None
+        self.session = None
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_request_start.append(self._on_request_start)
+        self.trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        self.trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        self.stats = {'requests': 0, 'connections_created': 0, 'connections_reused': 0}
+
+    async def start(self):
+        """
+        Cree le pool de connexions et la session partagee. Doit etre appele depuis la boucle d'evenements du bot.
+        :return:
+        """
+        self.connector = aiohttp.TCPConnector(
+            limit=self.LIMIT,
+            limit_per_host=self.LIMIT_PER_HOST,
+            use_dns_cache=True,
+            ttl_dns_cache=self.DNS_CACHE_TTL,
+            keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=self.connector,
+            timeout=self.timeout,
+            trace_configs=[self.trace_config],
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+        logger.info(f"Pooled HTTP session started (limit={self.LIMIT}, limit_per_host={self.LIMIT_PER_HOST}).")
+
+    @property
+    def timeout(self):
+        return aiohttp.ClientTimeout(total=self.TOTAL_TIMEOUT, connect=self.CONNECT_TIMEOUT)
+
+    @property
+    def closed(self):
+        return self.session is None or self.session.closed
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    def cookie_session(self):
+        """
+        Cree une session avec ses propres cookies, mais qui partage le pool de connexions.
+        Utile pour les echanges en plusieurs etapes qui reposent sur une session PHP.
+        :return: Session aiohttp a fermer par l'appelant
+        """
+        return aiohttp.ClientSession(
+            connector=self.connector,
+            connector_owner=False,
+            timeout=self.timeout,
+            trace_configs=[self.trace_config],
+        )
+
+    @property
+    def reuse_ratio(self):
+        opened = self.stats['connections_created'] + self.stats['connections_reused']
+        return self.stats['connections_reused'] / opened if opened else 0.0
+
+    def log_stats(self):
+        logger.info(f"HTTP session stats: {self.stats['requests']} requests, "
+                    f"{self.stats['connections_created']} connections created, "
+                    f"{self.stats['connections_reused']} reused ({self.reuse_ratio:.0%}).")
+
+    async def _on_request_start(self, session, context, params):
+        self.stats['requests'] += 1
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.stats['connections_created'] += 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self.stats['connections_reused'] += 1
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+        if self.connector is not None:
+            await self.connector.close()
+        logger.info("Pooled HTTP session closed.")
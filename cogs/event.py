@@ -1,19 +1,27 @@
 import os
-import queue
+import time
 import asyncio
 import re
 import pytz
 import random
-import json
 import logging
+from typing import Literal
 from datetime import datetime, timedelta
 
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord import app_commands, EntityType, Role, ScheduledEvent, MessageType, Guild, TextChannel
 
-from main import GUILD_ID, VOICE_CHANNEL_ID, APP_ID
+from main import VOICE_CHANNEL_ID
 from cogs.apis.framadate_api import FramadateAPI
+from cogs.services.poll_store import PollStore
+from cogs.services.poll_scheduler import PollScheduler, AdaptiveCheckInterval
+from cogs.services.reaction_pipeline import ReactionPipeline
+from cogs.services.pick_polls import PickPoll
+from cogs.services.member_index import MemberIndex
+from cogs.services.dm_outbox import DMOutbox
+from cogs.services.native_polls import NativePollTally
+from cogs.services.slot_scoring import SlotScorer
 from cogs.bot_responses.messages import ADMIN_MESSAGES, PC_MESSAGES, REMINDER_MESSAGES_1, REMINDER_MESSAGES_2, \
     REMINDER_MESSAGES_3, REMINDER_MESSAGES_4, DATE_FOUND_MESSAGES, DATE_NOT_FOUND_MESSAGES, FAILED_POLL_MESSAGES, \
     EVENT_CREATED_MESSAGE, CALL_TO_VOTE_MESSAGE
@@ -23,71 +31,215 @@ from cogs.bot_responses.poll_img import poll_images
 logger = logging.getLogger(__name__)
 
 
+class PickVoteButton(discord.ui.DynamicItem[discord.ui.Button], template=r'pick:(?P<index>\d+)'):
+    """
+    Bouton de vote d'un sondage pick. Son identifiant ne contient que l'index de l'option : le sondage est retrouvé
+    à partir du message de l'interaction, ce qui permet au bouton de rester actif après un redémarrage.
+    """
+    def __init__(self, index: int, label: str = None, emoji: str = None):
+        super().__init__(discord.ui.Button(label=label, emoji=emoji, style=discord.ButtonStyle.secondary,
+                                           custom_id=f'pick:{index}'))
+        self.index = index
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match['index']), item.label, item.emoji)
+
+    async def callback(self, interaction):
+        await interaction.client.get_cog('Event').button_vote(interaction, self.index)
+
+
 class Event(commands.Cog):
 
     NB_EMOJIS = ['1️⃣', '2️⃣', '3️⃣', '4️⃣', '5️⃣', '6️⃣', '7️⃣', '8️⃣', '9️⃣', '🔟', '🇦', '🇧', '🇨', '🇩', '🇪', '🇫', '🇬', '🇭',
                  '🇮', '🇯']
+    POLL_EMOJIS = frozenset(NB_EMOJIS)
 
-    POLLS_PATH = 'cogs/temp/polls.json'
-    CHECK_VOTERS_INTERVAL = 1  # minutes
+    MAX_CONCURRENT_CHECKS = 8
+    CHECK_TIMEOUT = 20  # secondes
     REMINDER_INTERVAL = 60*24  # minutes
+    REMINDER_DIGEST_WINDOW = 60*6  # minutes
+    RETRY_DELAY = 15  # minutes
     POLL_DATE_FORMAT = '%d/%m/%Y'
     EXTENDED_POLL_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
     SESSION_SEARCH_REGEX = r'session de (.*?)\s*\?'
     TIMEZONE_STR = 'Europe/Paris'
 
+    FRAMADATE_BACKEND = 'framadate'
+    DISCORD_BACKEND = 'discord'
+    NATIVE_POLL_MAX_ANSWERS = 10
+    NATIVE_POLL_MAX_HOURS = 768
+    NATIVE_VOTE_DEBOUNCE = 10  # secondes
+
     def __init__(self, bot):
         self.bot = bot
-        self.queue = queue.Queue()
-        self.loop = asyncio.create_task(self.update_embed_task())
-        self.framadate = FramadateAPI()
-        self.poll_check_loop.start()
+        self.reactions = ReactionPipeline(self.reaction_callback)
+        self.pick_polls = {}
+        self.pick_syncs = {}
+        self.reaction_stats = {'accepted': 0, 'dropped': 0}
+        self.members = MemberIndex()
+        self.scorer = SlotScorer()
+        self.native_polls = {}
+        self.native_votes = {}
+        self.framadate = FramadateAPI(http_session=bot.session)
+        self.polls = PollStore()
+        self.outbox = DMOutbox(bot, self.polls)
+        self.scheduler = PollScheduler()
+        self.check_intervals = AdaptiveCheckInterval()
+        self.check_semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_CHECKS)
+        self.scheduler_task = asyncio.create_task(self.run_poll_scheduler())
         logger.info("Event cog initialized.")
 
     def cog_unload(self):
-        self.poll_check_loop.cancel()
+        self.bot.remove_dynamic_items(PickVoteButton)
+        self.scheduler_task.cancel()
+        for sync in self.pick_syncs.values():
+            sync.cancel()
+        self.reactions.cancel()
+        self.outbox.close()
+        self.polls.close()
         logger.info("Event cog unloaded.")
 
-    @tasks.loop(minutes=CHECK_VOTERS_INTERVAL)
-    async def poll_check_loop(self):
+    async def run_poll_scheduler(self):
         """
-        Tâche asynchrone vérifiant si tous les votants ont voté pour un sondage.
+        Tâche asynchrone qui dort jusqu'à la prochaine échéance d'un sondage (expiration, rappel ou vérification
+        des votes) puis ne traite que les sondages concernés.
         :return:
         """
-        logger.info("Poll check loop triggered.")
-        await self.check_voters()
+        await self.bot.wait_until_ready()
+        for poll_info in self.polls.all():
+            self.arm_poll(poll_info)
+        for record in self.polls.pick_polls():
+            poll = PickPoll.from_record(record)
+            self.pick_polls[poll.message_id] = poll
+            self.arm_pick_poll(poll)
+            if not poll.buttons:
+                self.pick_syncs[poll.message_id] = asyncio.create_task(self.sync_pick_poll(poll))
+        logger.info(f"Poll scheduler started with {len(self.scheduler)} deadlines.")
 
-    def load_or_initialize_polls(self):
+        while True:
+            await self.scheduler.wait()
+            due_polls = self.scheduler.pop_due(time.time())
+            if not due_polls:
+                continue
+            logger.info(f"Poll scheduler triggered for {len(due_polls)} polls.")
+            due_picks = [name for name, kinds in due_polls.items() if PollScheduler.PICK_REMINDER in kinds]
+            for name in due_picks:
+                del due_polls[name]
+            try:
+                if due_picks:
+                    await self.remind_pick_polls(due_picks)
+                if due_polls:
+                    await self.check_voters(due_polls)
+            except Exception as e:
+                logger.exception(f"Error while checking polls: {e}")
+            finally:
+                self.rearm_dropped([*due_picks, *due_polls])
+
+    def rearm_dropped(self, names):
         """
-        Charge les informations des sondages depuis le fichier de suivi.
+        Reprogramme, après un délai, les sondages encore suivis dont les échéances ont été retirées sans être
+        reprogrammées parce que leur traitement a échoué.
+        :param names: Noms des sondages traités (identifiants des messages pour les sondages pick)
         :return:
         """
-        logger.info("Loading or initializing polls.")
-        if not os.path.exists(self.POLLS_PATH):
-            with open(self.POLLS_PATH, 'w') as file:
-                json.dump({}, file)
-                return {}
+        retry_at = time.time() + self.RETRY_DELAY * 60
+        for name in names:
+            if any(self.scheduler.deadline(name, kind) for kind in PollScheduler.KINDS):
+                continue
+            if name.isdigit():
+                poll = self.pick_polls.get(int(name))
+                if poll is not None:
+                    self.arm_pick_poll(poll, not_before=retry_at)
+                continue
+            poll_info = self.polls.get(name)
+            if poll_info:
+                logger.warning(f"Poll {name} lost its deadlines, retrying in {self.RETRY_DELAY} minutes.")
+                self.arm_poll(poll_info, not_before=retry_at)
 
-        with open(self.POLLS_PATH, 'r') as file:
-            try:
-                return json.load(file)
-            except json.JSONDecodeError:
-                logger.error("Failed to load polls data, returning empty.")
-                return {}
+    def parse_date(self, date_str, date_format):
+        date = datetime.strptime(date_str, date_format)
+        return date.replace(tzinfo=pytz.timezone(self.TIMEZONE_STR))
 
-    def write_polls_data(self, polls_data):
+    def arm_poll(self, poll_info, not_before=0):
         """
-        Écrit les informations des sondages dans le fichier de suivi.
-        :param polls_data: Dictionnaire contenant les informations des sondages
+        Programme les échéances d'un sondage : son expiration, son prochain rappel et sa prochaine vérification.
+        :param poll_info: Dictionnaire contenant les informations du sondage
+        :param not_before: Timestamp avant lequel aucune échéance n'est programmée
         :return:
         """
-        logger.info("Writing polls data to file.")
-        with open(self.POLLS_PATH, 'w') as file:
-            json.dump(polls_data, file, indent=4)
+        poll_name = poll_info['poll_name']
+        now = time.time()
+        expire_at = self.parse_date(poll_info['expire_at'], self.POLL_DATE_FORMAT).timestamp()
+        self.scheduler.schedule(poll_name, PollScheduler.EXPIRE, max(expire_at, not_before))
+        if poll_info['send_reminders'] and poll_info.get('last_reminder_sent'):
+            last_reminder = self.parse_date(poll_info['last_reminder_sent'], self.EXTENDED_POLL_DATE_FORMAT)
+            self.scheduler.schedule(poll_name, PollScheduler.REMINDER,
+                                    max(last_reminder.timestamp() + self.REMINDER_INTERVAL * 60, not_before))
+        self.scheduler.schedule(poll_name, PollScheduler.CHECK,
+                                max(now + self.check_intervals.next_interval(poll_name, active=True), not_before))
+        if poll_info.get('backend') == self.DISCORD_BACKEND:
+            self.native_polls[int(poll_info['message_id'])] = poll_name
+
+    def arm_pick_poll(self, poll, not_before=0):
+        """
+        Programme le prochain rappel d'un sondage pick, un intervalle de rappel après le précédent (ou après sa
+        création).
+        :param poll: État des votes du sondage
+        :param not_before: Timestamp avant lequel le rappel n'est pas programmé
+        :return:
+        """
+        if not poll.send_reminders:
+            return
+        last_reminder = poll.last_reminder_at or poll.created_at or time.time()
+        self.scheduler.schedule(str(poll.message_id), PollScheduler.PICK_REMINDER,
+                                max(last_reminder + self.REMINDER_INTERVAL * 60, not_before))
+
+    async def sync_pick_poll(self, poll):
+        """
+        Relit les réactions d'un sondage pick chargé depuis la base de suivi, afin de prendre en compte les votes
+        ajoutés ou retirés pendant que le bot était hors ligne, puis enregistre le nouvel état.
+        :param poll: État des votes du sondage
+        :return:
+        """
+        try:
+            message = await self.bot.get_channel(poll.channel_id).fetch_message(poll.message_id)
+            await poll.sync_reactions(message, self.NB_EMOJIS)
+        except discord.errors.NotFound:
+            logger.info(f"Pick poll {poll.message_id} no longer exists, removing it.")
+            self.forget_pick_poll(poll.message_id)
+            return
+        except Exception as e:
+            logger.warning(f"Could not read the reactions of pick poll {poll.message_id}: {e}")
+            return
+        finally:
+            self.pick_syncs.pop(poll.message_id, None)
+        self.polls.update_pick_poll(poll.message_id, masks=poll.masks, members=poll.members)
+        logger.info(f"Synced the votes of pick poll {poll.message_id} with its reactions.")
+
+    def track_pick_poll(self, poll):
+        """
+        Ajoute un sondage pick à l'index des sondages actifs et programme ses rappels.
+        :param poll: État des votes du sondage
+        :return:
+        """
+        self.pick_polls[poll.message_id] = poll
+        self.polls.add_pick_poll(poll.to_record())
+        self.arm_pick_poll(poll)
+
+    def forget_pick_poll(self, message_id):
+        """
+        Retire un sondage pick de l'index des sondages actifs.
+        :param message_id: Identifiant du message du sondage
+        :return:
+        """
+        self.pick_polls.pop(message_id, None)
+        self.scheduler.cancel(str(message_id), PollScheduler.PICK_REMINDER)
+        self.polls.remove_pick_poll(message_id)
 
     def save_poll_info(self, poll_name, poll_data):
         """
-        Sauvegarde les informations d'un sondage dans le fichier de suivi.
+        Sauvegarde les informations d'un sondage dans la base de suivi.
         :param poll_name: Nom du sondage (index du dictionnaire)
         :param poll_data: Dictionnaire contenant les informations du sondage
         :return:
@@ -96,15 +248,13 @@ class Event(commands.Cog):
         now = datetime.now(tz=pytz.timezone(self.TIMEZONE_STR)).strftime(self.EXTENDED_POLL_DATE_FORMAT)
         formatted_poll_name = f'{poll_name} - {now}'
 
-        polls_data = self.load_or_initialize_polls()
-
         poll_data['created_at'] = (datetime.now(tz=pytz.timezone(self.TIMEZONE_STR))
                                    .strftime(self.EXTENDED_POLL_DATE_FORMAT))
         poll_data['last_reminder_sent'] = now
         poll_data['poll_name'] = formatted_poll_name
 
-        polls_data[formatted_poll_name] = poll_data
-        self.write_polls_data(polls_data)
+        self.polls.add(poll_data)
+        self.arm_poll(poll_data)
 
     @staticmethod
     def choose_reminder_message(reminder_count, member, jump_url):
@@ -126,75 +276,80 @@ class Event(commands.Cog):
             reminder_message = random.choice(REMINDER_MESSAGES_4)
         return reminder_message.format(member.mention, jump_url)
 
-    async def send_reminders_date_poll(self, non_responders, poll_info):
+    def find_non_responders(self, non_responders, poll_info):
         """
-        Envoie un rappel aux joueurs n'ayant pas encore répondu à un sondage.
+        Retrouve les membres correspondant aux joueurs n'ayant pas encore répondu à un sondage.
         :param non_responders: Liste des joueurs n'ayant pas encore répondu
         :param poll_info: Dictionnaire contenant les informations du sondage
-        :return:
+        :return: Liste des membres trouvés
         """
-        logger.info(f"Sending reminders for poll {poll_info['poll_name']}.")
         guild = self.bot.get_guild(poll_info['guild_id'])
         if not guild:
             logger.warning(f"Guild {poll_info['guild_id']} not found.")
-            return None
+            return []
         role = guild.get_role(int(poll_info['role_id']))
-        if role:
-            for non_responder_name in non_responders:
-                member = discord.utils.find(
-                    lambda m, name=non_responder_name: m.display_name == name and role in m.roles,
-                    self.bot.get_all_members())
-
-                if member:
-                    try:
-                        message = self.choose_reminder_message(poll_info['reminder_count'],
-                                                               member, poll_info['jump_url'])
-                        await member.send(message)
-                        logger.info(f"Reminder sent to {member.display_name} for poll {poll_info['poll_name']}.")
-                    except discord.HTTPException as e:
-                        logger.error(f"Failed to send reminder to {member.display_name}: {e}")
-
-    async def should_send_reminder(self, poll_info):
-        """
-        Vérifie si un rappel doit être envoyé pour un sondage.
-        :param poll_info: Dictionnaire contenant les informations du sondage
-        :return: Booléen indiquant si un rappel doit être envoyé
-        """
-        logger.info(f"Checking if reminder should be sent for poll {poll_info['poll_name']}.")
-        if poll_info['send_reminders'] == 'False':
-            return False
-
-        if poll_info and 'last_reminder_sent' in poll_info:
-            last_reminder = poll_info['last_reminder_sent']
-            if last_reminder:
-                last_reminder_date = datetime.strptime(last_reminder, self.EXTENDED_POLL_DATE_FORMAT)
-                last_reminder_date = last_reminder_date.replace(tzinfo=pytz.timezone(self.TIMEZONE_STR))
-                if (datetime.now(tz=pytz.timezone(self.TIMEZONE_STR)) -
-                        last_reminder_date >= timedelta(minutes=self.REMINDER_INTERVAL)):
-                    return True
-        return False
+        if not role:
+            return []
+        player_ids = poll_info.get('player_ids') or {}
+        members = []
+        for non_responder_name in non_responders:
+            member_id = player_ids.get(non_responder_name)
+            if member_id:
+                member = guild.get_member(member_id)
+            else:
+                member = self.members.find(guild, non_responder_name, role)
+            if member:
+                members.append(member)
+        return members
 
-    async def remove_poll_from_tracking(self, poll_name):
+    def send_reminder_digests(self, reminders):
         """
-        Supprime un sondage du fichier de suivi.
-        :param poll_name: Nom du sondage (index du dictionnaire)
+        Envoie un seul rappel par joueur pour l'ensemble des sondages auxquels il n'a pas encore répondu dans ce
+        cycle. Le message suit l'escalade du sondage le plus en retard, et liste les autres sondages en attente.
+        :param reminders: Liste de tuples (informations du sondage, joueurs n'ayant pas répondu)
+        :return:
+        """
+        digests = {}
+        for poll_info, non_responders in reminders:
+            for member in self.find_non_responders(non_responders, poll_info):
+                digests.setdefault(member.id, (member, []))[1].append(poll_info)
+
+        messages = []
+        for member, polls in digests.values():
+            polls.sort(key=lambda poll_info: poll_info['reminder_count'], reverse=True)
+            overdue = polls[0]
+            message = self.choose_reminder_message(overdue['reminder_count'], member, overdue['jump_url'])
+            if len(polls) > 1:
+                message += '\nTu as aussi d\'autres sondages en attente :\n' + '\n'.join(
+                    f"- {poll_info['poll_name'].split(' - ')[0]} : {poll_info['jump_url']}" for poll_info in polls[1:])
+            messages.append((member.id, message))
+
+        reminders_count = sum(len(polls) for _, polls in digests.values())
+        self.outbox.send_many(messages, batch=f'reminders-{int(time.time())}')
+        logger.info(f"Sent {len(messages)} reminder digests for {reminders_count} reminders "
+                    f"({reminders_count - len(messages)} DMs saved).")
+
+    def forget_poll(self, poll_info):
+        """
+        Annule les échéances d'un sondage et oublie les données conservées en mémoire à son sujet.
+        :param poll_info: Dictionnaire contenant les informations du sondage
         :return:
         """
-        logger.info(f"Removing poll {poll_name} from tracking.")
-        with open(self.POLLS_PATH, 'r+') as file:
-            polls = json.load(file)
-            if poll_name in polls:
-                del polls[poll_name]
-                file.seek(0)
-                file.truncate()
-                json.dump(polls, file, indent=4)
+        self.scheduler.cancel(poll_info['poll_name'])
+        self.check_intervals.forget(poll_info['poll_name'])
+        if poll_info.get('backend') == self.DISCORD_BACKEND:
+            self.native_polls.pop(int(poll_info['message_id']), None)
+            self.native_votes.pop(int(poll_info['message_id']), None)
+        else:
+            self.framadate.forget_poll(poll_info['admin_url'])
 
-    async def finalize_poll_and_notify(self, poll_data, date_found):
+    async def finalize_poll_and_notify(self, poll_data, date_found, alternatives=()):
         """
         Envoie un message de clôture du sondage à l'utilisateur qui l'a créé et dans le canal où il a été créé. Enfin,
-        supprime le sondage du fichier de suivi.
+        supprime le sondage de la base de suivi.
         :param poll_data: Dictionnaire contenant les informations du sondage
         :param date_found: Date trouvée par le sondage
+        :param alternatives: Dates de repli, de la meilleure à la moins bonne
         :return:
         """
         logger.info(f"Finalizing poll {poll_data['poll_name']} and notifying.")
@@ -232,12 +387,18 @@ class Event(commands.Cog):
             date = date.replace(tzinfo=pytz.timezone(self.TIMEZONE_STR))
             guild = role.guild
             message = random.choice(DATE_FOUND_MESSAGES).format(mentions_str, role.mention, date_found)
+            if alternatives:
+                message += f"\nDates de repli si besoin : {', '.join(alternatives)}."
             event = await self.create_event(guild, role, mentions_str, date)
 
         else:
             message = random.choice(FAILED_POLL_MESSAGES).format(mentions_str, role.mention)
 
-        channel = await self.bot.fetch_channel(channel_id)
+        try:
+            channel = await self.bot.fetch_channel(channel_id)
+        except (discord.NotFound, discord.Forbidden) as e:
+            logger.warning(f"Channel {channel_id} of poll {poll_data['poll_name']} is not reachable: {e}")
+            return
         if channel:
             try:
                 poll_message = await channel.fetch_message(message_id)
@@ -281,126 +442,276 @@ class Event(commands.Cog):
         logger.info(f"No notification sent for poll {poll_data['poll_name']}, last notification too recent.")
         return None
 
-    async def check_voters(self):
-        logger.info("Checking voters for all polls.")
-        with open(self.POLLS_PATH, 'r+') as file:
-            polls_data = json.load(file)
-            current_date = datetime.now(tz=pytz.timezone(self.TIMEZONE_STR))
+    async def fetch_check_data(self, poll_info):
+        """
+        Analyse les votes d'un sondage, en limitant le nombre d'analyses simultanées et leur durée.
+        :param poll_info: Dictionnaire contenant les informations du sondage
+        :return: Résultat de l'analyse du sondage, ou None si une erreur s'est produite
+        """
+        async with self.check_semaphore:
+            try:
+                required = [poll_info['gm_name']] if poll_info.get('gm_name') else []
+                if poll_info.get('backend') == self.DISCORD_BACKEND:
+                    return await asyncio.wait_for(self.native_check_data(poll_info, required),
+                                                  timeout=self.CHECK_TIMEOUT)
+                return await asyncio.wait_for(
+                    self.framadate.analyze_csv(poll_info['admin_url'], poll_info['players_count'], required),
+                    timeout=self.CHECK_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"Check of poll {poll_info['poll_name']} timed out after {self.CHECK_TIMEOUT}s.")
+            except Exception as e:
+                logger.error(f"Check of poll {poll_info['poll_name']} failed: {e}")
+        return None
 
-            expired_polls = []
-            to_update = False
+    async def native_check_data(self, poll_info, required=()):
+        """
+        Analyse les votes d'un sondage natif Discord. Les votes sont tenus à jour par les événements de vote ; le
+        message n'est relu que si le sondage n'est pas encore en mémoire (au démarrage).
+        :param poll_info: Dictionnaire contenant les informations du sondage
+        :param required: Joueurs dont la disponibilité est obligatoire
+        :return: Résultat de l'analyse du sondage
+        """
+        message_id = int(poll_info['message_id'])
+        tally = self.native_votes.get(message_id)
+        if tally is None:
+            channel = self.bot.get_channel(poll_info['channel_id'])
+            message = await channel.fetch_message(message_id)
+            tally = self.native_votes[message_id] = await NativePollTally.from_message(message, poll_info['answers'])
+        return tally.summary(poll_info.get('player_ids') or {}, poll_info['players_count'], self.scorer, required)
+
+    async def check_voters(self, due_polls):
+        """
+        Traite les sondages dont une échéance est atteinte, puis reprogramme leurs prochaines échéances.
+        Les sondages sont analysés en parallèle et les modifications sont enregistrées en une seule transaction.
+        L'échec du traitement d'un sondage n'interrompt pas celui des autres : il est reprogrammé après un délai.
+        Si un rappel est envoyé, les rappels prévus dans la fenêtre de regroupement sont avancés pour partir dans
+        le même message.
+        :param due_polls: Dictionnaire {nom du sondage: types d'échéances atteintes}
+        :return:
+        """
+        logger.info(f"Checking voters for {len(due_polls)} polls.")
+        started_at = time.monotonic()
+        updates = {}
+        removals = []
+        to_check = []
+        reminders = []
+
+        for poll_name, kinds in due_polls.items():
+            poll_info = self.polls.get(poll_name)
+            if not poll_info:
+                logger.warning(f"Poll {poll_name} is no longer tracked, skipping.")
+                self.scheduler.cancel(poll_name)
+            elif PollScheduler.EXPIRE in kinds:
+                try:
+                    await self.finalize_poll_and_notify(poll_info, None)
+                except Exception as e:
+                    self.poll_failed(poll_info, e)
+                    continue
+                self.forget_poll(poll_info)
+                removals.append(poll_name)
+            else:
+                to_check.append(poll_info)
 
-            for poll_name, poll_info in polls_data.items():
-                expire_date = datetime.strptime(poll_info['expire_at'], self.POLL_DATE_FORMAT)
-                expire_date = expire_date.replace(tzinfo=pytz.timezone(self.TIMEZONE_STR))
+        await self.check_polls(to_check, due_polls, updates, removals, reminders)
 
-                if expire_date < current_date:
-                    expired_polls.append(poll_name)
-                    await self.finalize_poll_and_notify(polls_data[poll_name], None)
-                    to_update = True
+        if reminders:
+            early = []
+            for poll_name in self.scheduler.pop_kind_before(PollScheduler.REMINDER,
+                                                            time.time() + self.REMINDER_DIGEST_WINDOW * 60,
+                                                            skip=due_polls):
+                due_polls[poll_name] = {PollScheduler.REMINDER}
+                poll_info = self.polls.get(poll_name)
+                if poll_info:
+                    early.append(poll_info)
                 else:
-                    check_data = await self.framadate.analyze_csv(poll_info['admin_url'], poll_info['players_count'])
-                    if not check_data:
-                        logger.warning(f"No check data for poll {poll_name}, skipping.")
-                        continue
-
-                    non_responders = check_data['non_responders']
-                    date_found = check_data['date_found']
-                    all_responded = check_data['all_responded']
-
-                    if all_responded:
-                        if date_found:
-                            await self.finalize_poll_and_notify(poll_info, date_found)
-                            expired_polls.append(poll_name)
-                            to_update = True
-                        else:
-                            notification_sent = await self.notify_all_responded_date_not_found(poll_info)
-                            if notification_sent:
-                                polls_data[poll_name]['last_channel_notification'] = notification_sent
-                                to_update = True
-                    elif await self.should_send_reminder(polls_data.get(poll_name)):
-                        logger.info(f"Sending reminder for poll {poll_name}.")
-                        await self.send_reminders_date_poll(non_responders, poll_info)
-                        new_reminder_count = poll_info['reminder_count'] + 1
-                        polls_data.get(poll_name)['last_reminder_sent'] = datetime.now(
-                            tz=pytz.timezone(self.TIMEZONE_STR)).strftime(self.EXTENDED_POLL_DATE_FORMAT)
-                        polls_data.get(poll_name)['reminder_count'] = new_reminder_count
-                        to_update = True
-
-            if to_update:
-                for poll_name in expired_polls:
-                    logger.info(f"Removing expired poll {poll_name}.")
-                    del polls_data[poll_name]
-                file.seek(0)
-                file.truncate()
-                json.dump(polls_data, file, indent=4)
-
-    async def send_reminders(self, poll, users):
-        logger.info(f"Sending reminders for poll {poll.id}.")
-        link = poll.jump_url
-        match = re.search(self.SESSION_SEARCH_REGEX, poll.embeds[0].title)
-        role = match.group(1)
+                    self.scheduler.cancel(poll_name)
+            if early:
+                logger.info(f"Bringing forward the reminders of {len(early)} polls into the digest.")
+                await self.check_polls(early, due_polls, updates, removals, reminders)
+            to_check.extend(early)
+
+        if reminders:
+            try:
+                self.send_reminder_digests(reminders)
+            except Exception as e:
+                logger.exception(f"Failed to send reminder digests: {e}")
+        self.polls.apply(updates, removals)
+        logger.info(f"Checked {len(to_check)} polls in {time.monotonic() - started_at:.2f}s.")
+
+    async def check_polls(self, to_check, due_polls, updates, removals, reminders):
+        """
+        Analyse des sondages en parallèle puis applique le résultat de chacun, en isolant les échecs.
+        :param to_check: Informations des sondages à analyser
+        :param due_polls: Dictionnaire {nom du sondage: types d'échéances atteintes}
+        :param updates: Dictionnaire {nom du sondage: colonnes à mettre à jour}, complété
+        :param removals: Noms des sondages à supprimer, complété
+        :param reminders: Liste de tuples (informations du sondage, joueurs n'ayant pas répondu), complétée
+        :return:
+        """
+        results = await asyncio.gather(*(self.fetch_check_data(poll_info) for poll_info in to_check))
+        for poll_info, check_data in zip(to_check, results):
+            try:
+                await self.apply_check(poll_info, due_polls[poll_info['poll_name']], check_data, updates, removals,
+                                       reminders)
+            except Exception as e:
+                self.poll_failed(poll_info, e)
+
+    def poll_failed(self, poll_info, error):
+        """
+        Journalise l'échec du traitement d'un sondage et le reprogramme après un délai.
+        :param poll_info: Dictionnaire contenant les informations du sondage
+        :param error: Erreur rencontrée
+        :return:
+        """
+        logger.exception(f"Failed to process poll {poll_info['poll_name']}, retrying in {self.RETRY_DELAY} "
+                         f"minutes: {error}")
+        self.arm_poll(poll_info, not_before=time.time() + self.RETRY_DELAY * 60)
+
+    async def apply_check(self, poll_info, kinds, check_data, updates, removals, reminders):
+        """
+        Applique le résultat de l'analyse d'un sondage : clôture, notification ou rappel, puis reprogrammation de ses
+        échéances.
+        :param poll_info: Dictionnaire contenant les informations du sondage
+        :param kinds: Types d'échéances atteintes
+        :param check_data: Résultat de l'analyse du sondage, ou None si elle a échoué
+        :param updates: Dictionnaire {nom du sondage: colonnes à mettre à jour}, complété
+        :param removals: Noms des sondages à supprimer, complété
+        :param reminders: Liste de tuples (informations du sondage, joueurs n'ayant pas répondu), complétée
+        :return:
+        """
+        poll_name = poll_info['poll_name']
+        now = time.time()
+        expire_at = self.scheduler.deadline(poll_name, PollScheduler.EXPIRE)
+        next_check = now + self.check_intervals.next_interval(
+            poll_name, active=bool(check_data and check_data['vote_delta']),
+            time_left=expire_at - now if expire_at else None)
+        if poll_info.get('backend') != self.DISCORD_BACKEND:
+            self.scheduler.schedule(poll_name, PollScheduler.CHECK, next_check)
+
+        if not check_data:
+            logger.warning(f"No check data for poll {poll_name}, skipping.")
+            if PollScheduler.REMINDER in kinds:
+                self.scheduler.schedule(poll_name, PollScheduler.REMINDER, next_check)
+            return
+
+        non_responders = check_data['non_responders']
+        date_found = check_data['date_found']
+        all_responded = check_data['all_responded']
+
+        if not check_data['changed'] and not all_responded and PollScheduler.REMINDER not in kinds:
+            logger.info(f"No new activity on poll {poll_name}.")
+            return
+
+        if all_responded:
+            if date_found:
+                await self.finalize_poll_and_notify(poll_info, date_found, check_data['alternatives'])
+                self.forget_poll(poll_info)
+                removals.append(poll_name)
+                return
+            notification_sent = await self.notify_all_responded_date_not_found(poll_info)
+            if notification_sent:
+                updates.setdefault(poll_name, {})['last_channel_notification'] = notification_sent
+            if PollScheduler.REMINDER in kinds:
+                self.scheduler.schedule(poll_name, PollScheduler.REMINDER, next_check)
+        elif PollScheduler.REMINDER in kinds:
+            logger.info(f"Sending reminder for poll {poll_name}.")
+            reminders.append((poll_info, non_responders))
+            updates.setdefault(poll_name, {}).update({
+                'last_reminder_sent': datetime.now(
+                    tz=pytz.timezone(self.TIMEZONE_STR)).strftime(self.EXTENDED_POLL_DATE_FORMAT),
+                'reminder_count': poll_info['reminder_count'] + 1,
+            })
+            self.scheduler.schedule(poll_name, PollScheduler.REMINDER,
+                                    time.time() + self.REMINDER_INTERVAL * 60)
+
+    async def remind_pick_polls(self, names):
+        """
+        Envoie les rappels des sondages pick arrivés à échéance et programme les suivants.
+        :param names: Identifiants des messages des sondages, sous forme de chaînes
+        :return:
+        """
+        for name in names:
+            poll = self.pick_polls.get(int(name))
+            if poll is None:
+                continue
+            try:
+                await self.send_reminders(poll, poll.non_voters(), poll.best_dates())
+            except discord.errors.NotFound:
+                logger.info(f"Pick poll {poll.message_id} no longer exists, removing it.")
+                self.forget_pick_poll(poll.message_id)
+                continue
+            except Exception as e:
+                logger.exception(f"Failed to send reminders of pick poll {poll.message_id}, retrying in "
+                                 f"{self.RETRY_DELAY} minutes: {e}")
+                self.arm_pick_poll(poll, not_before=time.time() + self.RETRY_DELAY * 60)
+                continue
+            poll.last_reminder_at = time.time()
+            self.polls.update_pick_poll(poll.message_id, last_reminder_at=poll.last_reminder_at)
+            self.arm_pick_poll(poll)
+
+    async def send_reminders(self, poll, users, best_dates=()):
+        """
+        Envoie un rappel aux joueurs n'ayant pas voté pour un sondage pick.
+        :param poll: État des votes du sondage
+        :param users: Identifiants des joueurs n'ayant pas voté
+        :param best_dates: Meilleures dates partielles, sous la forme (date, nombre d'absents)
+        :return:
+        """
+        logger.info(f"Sending reminders for poll {poll.message_id}.")
+        message = self.bot.get_channel(poll.channel_id).get_partial_message(poll.message_id)
+        link = message.jump_url
+        role = poll.role_name
         if not users:
             msg = f"Rappel: L'ensemble des joueurs ont voté, mais aucune date commune n'a été trouvé pour la " \
                   f"prochaine session de {role}."
         else:
-            msg = f'Rappel: {", ".join(users)} merci de voter pour la date de la prochaine session de {role}: {link}'
-        await poll.reply(content=msg)
-        for user in users:
-            user_obj = await self.bot.fetch_user(user[2:-1])
-            dm_channel = await user_obj.create_dm()
-            await dm_channel.send(f"N'oublie pas de participer au sondage pour la prochaine session de {role}: {link}")
-
-    async def get_voters(self, msg):
-        logger.info(f"Getting voters for poll {msg.id}.")
-        reactions = [reaction for reaction in msg.reactions if reaction.emoji in self.NB_EMOJIS]
-        voters = []
-        for r in reactions:
-            voters += [user.mention async for user in r.users() if not user.bot]
-        return list(set(voters))
-
-    async def find_alerts(self, channel, poll, not_voters):
-        logger.info(f"Searching for alerts related to poll {poll.id}.")
-        alert_send = False
-        poll_date = poll.created_at
-        now = datetime.now(tz=pytz.timezone(self.TIMEZONE_STR))
-        async for msg in channel.history(limit=1000):
-            if msg.type == MessageType.reply and msg.reference.message_id == poll.id:
-                if msg.content.startswith('Rappel:'):
-                    alert_send = True
-                    msg_date = msg.created_at
-                    diff = (now - msg_date).total_seconds() / 3600
-                    if diff >= 24.0:
-                        await self.send_reminders(poll, not_voters)
-                    break
-
-        diff = (now - poll_date).total_seconds() / 3600
-        if not alert_send and diff >= 24.0:
-            await self.send_reminders(poll, not_voters)
-
-    @tasks.loop(minutes=60)
-    async def find_polls(self):
-        logger.info("Finding polls to check.")
-        guild = self.bot.get_guild(int(GUILD_ID))
-        for channel in guild.text_channels:
+            mentions = ', '.join(f'<@{user_id}>' for user_id in users)
+            msg = f'Rappel: {mentions} merci de voter pour la date de la prochaine session de {role}: {link}'
+        if best_dates:
+            msg += '\nMeilleures dates pour l\'instant : ' + ', '.join(
+                f'{date} ({missing} absent{"s" if missing > 1 else ""})' for date, missing in best_dates)
+        await message.reply(content=msg)
+        self.outbox.send_many(
+            [(user_id, f"N'oublie pas de participer au sondage pour la prochaine session de {role}: {link}")
+             for user_id in users],
+            batch=f'pick-reminder-{poll.message_id}')
+
+    @commands.hybrid_command(name="pick_rebuild", with_app_command=True,
+                             description="Reconstruit l'index des sondages pick depuis l'historique des channels",
+                             brief="Reconstruit l'index des sondages pick")
+    @commands.guild_only()
+    @commands.is_owner()
+    async def pick_rebuild(self, ctx):
+        """
+        Reconstruit l'index des sondages pick de la guilde à partir de l'historique de ses channels, avec la date du
+        dernier rappel de chaque sondage. Les rappels sont ensuite pilotés par l'index, sans parcours de l'historique.
+        """
+        logger.info(f"Rebuilding pick poll index for guild {ctx.guild.id}.")
+        count = 0
+        for channel in ctx.guild.text_channels:
+            last_reminders = {}
             async for msg in channel.history(limit=1000):
-                if msg.author.bot and msg.author.id == int(APP_ID):
-                    if msg.embeds and msg.embeds[0].title:
-                        embed = msg.embeds[0]
-                        match = re.search(self.SESSION_SEARCH_REGEX, embed.title)
-                        if not match:
-                            continue
-                        role = match.group(1)
-                        role = discord.utils.get(guild.roles, name=role)
-                        voters = await self.get_voters(msg)
-                        mentions = [user.mention for user in role.members if not user.bot]
-                        not_voters = [mention for mention in mentions if mention not in voters]
-                        await self.find_alerts(channel, msg, not_voters)
+                if msg.author.id != self.bot.user.id:
+                    continue
+                if msg.type == MessageType.reply and msg.content.startswith('Rappel:'):
+                    last_reminders.setdefault(msg.reference.message_id, msg.created_at.timestamp())
+                    continue
+                if not msg.embeds or not msg.embeds[0].title:
+                    continue
+                match = re.search(self.SESSION_SEARCH_REGEX, msg.embeds[0].title)
+                if not match:
+                    continue
+                poll = await PickPoll.from_message(msg, match.group(1), self.NB_EMOJIS,
+                                                   send_reminders=await self.check_embed_message(msg))
+                poll.last_reminder_at = last_reminders.get(msg.id)
+                self.track_pick_poll(poll)
+                count += 1
+        logger.info(f"Rebuilt pick poll index with {count} polls.")
+        await ctx.send(f'{count} sondages pick indexés.')
 
     @commands.Cog.listener()
     async def on_ready(self):
         logger.info("Event cog is ready")
-        await self.find_polls.start()
 
     async def create_event(self, guild: Guild, role: Role, users: str, date: datetime) -> ScheduledEvent:
         logger.info(f"Creating event for role {role} on {date}.")
@@ -453,74 +764,170 @@ class Event(commands.Cog):
                 return True
         return False
 
-    async def update_embed_task(self):
-        logger.info("Starting update embed task.")
-        while True:
-            try:
-                update = self.queue.get(block=False)
-            except queue.Empty:
-                await asyncio.sleep(1)
+    async def reaction_callback(self, message_id, payloads):
+        """
+        Applique un lot de réactions à l'état des votes d'un sondage, puis met à jour son embed en une seule fois.
+        :param message_id: Identifiant du message du sondage
+        :param payloads: Événements de réaction reçus pour ce message, dans l'ordre
+        :return:
+        """
+        logger.info(f"Handling {len(payloads)} reactions for message {message_id}.")
+        sync = self.pick_syncs.get(message_id)
+        if sync is not None:
+            await sync
+        poll = self.pick_polls.get(message_id)
+        if poll is None:
+            return
+
+        for payload in payloads:
+            index = self.NB_EMOJIS.index(payload.emoji.name)
+            if index >= len(poll.options):
                 continue
+            if payload.event_type == 'REACTION_ADD':
+                poll.add_vote(index, payload.user_id)
+            else:
+                poll.remove_vote(index, payload.user_id)
 
-            await self.reaction_callback(payload=update)
-            self.queue.task_done()
+        message = self.bot.get_channel(poll.channel_id).get_partial_message(message_id)
+        found = poll.date_found()
+        if found is not None:
+            await self.close_pick_poll(poll, found)
+            await message.delete()
 
-    async def reaction_callback(self, payload):
-        logger.info(f"Handling reaction callback for message {payload.message_id} by user {payload.user_id}.")
-        user = self.bot.get_user(payload.user_id)
-        if user != self.bot.user and payload.emoji.name in self.NB_EMOJIS:
-            channel = self.bot.get_channel(payload.channel_id)
-            message = await channel.fetch_message(payload.message_id)
+        else:
+            logger.info(f"Date not found, updating message.")
+            self.polls.update_pick_poll(message_id, masks=poll.masks, members=poll.members)
+            await message.edit(embed=poll.render())
 
-            if not await self.check_embed_message(message):
-                return
-            embed = message.embeds[0]
-            date_found = None
-            field = next((f for f in embed.fields if f.name.startswith(str(payload.emoji))), None)
-            if field:
-                msg = field.value.split('\n')
-                votes = msg[0]
-                users = msg[1] if len(msg) > 1 else ""
-                count, total = map(int, votes.split('Votes: ')[1].split('/'))
-                user = user.mention
-                if user in users:
-                    count -= 1
-                    users = users.replace(user, "")
-                else:
-                    count += 1
-                    users += f' {user}'
-                embed.set_field_at(index=self.NB_EMOJIS.index(str(payload.emoji)),
-                                   name=field.name, value=f'Votes: {count}/{total}\n{users}')
-                if count == total:
-                    date_found = field.name
+    async def close_pick_poll(self, poll, found):
+        """
+        Crée l'événement de la date choisie par tous les joueurs d'un sondage pick, l'annonce et retire le sondage
+        de l'index. La suppression du message est laissée à l'appelant.
+        :param poll: État des votes du sondage
+        :param found: Index de l'option choisie
+        :return:
+        """
+        date_found = poll.options[found]
+        logger.info(f"Date found: {date_found}")
+        date = datetime.strptime(date_found.split('- ')[1], '%A %d %B %Y')
+        date = date.replace(tzinfo=pytz.timezone(self.TIMEZONE_STR))
+        channel = self.bot.get_channel(poll.channel_id)
+        guild = self.bot.get_guild(poll.guild_id)
+        role = discord.utils.get(guild.roles, name=poll.role_name)
+        mentions = [member.mention for member in role.members if not member.bot]
+        mentions_str = ', '.join(mentions)
+        event = await self.create_event(guild, role, mentions_str, date)
+        await self.send_message(channel, event.url, role, mentions_str)
+        self.forget_pick_poll(poll.message_id)
 
-            if date_found:
-                logger.info(f"Date found: {date_found}")
-                date = datetime.strptime(date_found.split('- ')[1], '%A %d %B %Y')
-                date = date.replace(tzinfo=pytz.timezone(self.TIMEZONE_STR))
-                match = re.search(self.SESSION_SEARCH_REGEX, embed.title)
-                role = match.group(1)
-                guild = self.bot.get_guild(payload.guild_id)
-                role = discord.utils.get(guild.roles, name=role)
-                mentions = [member.mention for member in role.members if not member.bot]
-                mentions_str = ', '.join(mentions)
-                event = await self.create_event(guild, role, mentions_str, date)
-                await self.send_message(channel, event.url, role, mentions_str)
-                await message.delete()
+    async def button_vote(self, interaction, index):
+        """
+        Applique le clic d'un joueur sur un bouton de vote : le vote pour l'option est ajouté ou retiré, et l'embed
+        est mis à jour dans la réponse à l'interaction.
+        :param interaction: Interaction du bouton
+        :param index: Index de l'option
+        :return:
+        """
+        poll = self.pick_polls.get(interaction.message.id)
+        if poll is None or index >= len(poll.options):
+            return await interaction.response.send_message("Ce sondage n'est plus actif.", ephemeral=True)
+        added = poll.toggle_vote(index, interaction.user.id)
+        logger.info(f"Vote {'added' if added else 'removed'} by {interaction.user.id} on option {index} of pick "
+                    f"poll {poll.message_id}.")
+
+        found = poll.date_found()
+        if found is not None:
+            await interaction.response.edit_message(embed=poll.render(), view=None)
+            await self.close_pick_poll(poll, found)
+            await interaction.message.delete()
+        else:
+            self.polls.update_pick_poll(poll.message_id, masks=poll.masks, members=poll.members)
+            await interaction.response.edit_message(embed=poll.render())
 
-            else:
-                logger.info(f"Date not found, updating message.")
-                await message.edit(embed=embed)
+    def accept_reaction(self, payload):
+        """
+        Filtre un événement brut de réaction avant tout traitement : seules les réactions des membres sur un sondage
+        pick actif, avec un emoji d'option, sont retenues.
+        :param payload: Événement brut de réaction
+        :return: True si l'événement doit être traité
+        """
+        poll = self.pick_polls.get(payload.message_id)
+        if (poll is not None and not poll.buttons and payload.emoji.name in self.POLL_EMOJIS
+                and payload.user_id != self.bot.user.id):
+            self.reaction_stats['accepted'] += 1
+            return True
+        self.reaction_stats['dropped'] += 1
+        return False
+
+    def log_reaction_stats(self):
+        logger.info(f"Reaction stats: {self.reaction_stats['accepted']} accepted, "
+                    f"{self.reaction_stats['dropped']} dropped.")
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
-        logger.info(f"Reaction added: {payload.emoji.name} by {payload.user_id}.")
-        self.queue.put(payload)
+        if self.accept_reaction(payload):
+            logger.info(f"Reaction added: {payload.emoji.name} by {payload.user_id}.")
+            self.reactions.put(payload)
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload):
-        logger.info(f"Reaction removed: {payload.emoji.name} by {payload.user_id}.")
-        self.queue.put(payload)
+        if self.accept_reaction(payload):
+            logger.info(f"Reaction removed: {payload.emoji.name} by {payload.user_id}.")
+            self.reactions.put(payload)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        self.members.add(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.members.remove(member)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        self.members.update(before, after)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before, after):
+        for guild in after.mutual_guilds:
+            member = guild.get_member(after.id)
+            if member:
+                self.members.update_user(before, member)
+
+    def native_vote(self, payload, added):
+        """
+        Applique un vote reçu sur un sondage natif suivi, puis avance sa prochaine vérification.
+        :param payload: Événement brut de vote
+        :param added: True si le vote est ajouté, False s'il est retiré
+        :return:
+        """
+        poll_name = self.native_polls.get(payload.message_id)
+        if poll_name is None:
+            return
+        tally = self.native_votes.get(payload.message_id)
+        if tally is not None:
+            if added:
+                tally.add_vote(payload.answer_id, payload.user_id)
+            else:
+                tally.remove_vote(payload.answer_id, payload.user_id)
+        due = time.time() + self.NATIVE_VOTE_DEBOUNCE
+        next_check = self.scheduler.deadline(poll_name, PollScheduler.CHECK)
+        if next_check is None or next_check > due:
+            self.scheduler.schedule(poll_name, PollScheduler.CHECK, due)
+
+    @commands.Cog.listener()
+    async def on_raw_poll_vote_add(self, payload):
+        self.native_vote(payload, added=True)
+
+    @commands.Cog.listener()
+    async def on_raw_poll_vote_remove(self, payload):
+        self.native_vote(payload, added=False)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        if payload.message_id in self.pick_polls:
+            logger.info(f"Pick poll {payload.message_id} deleted.")
+            self.forget_pick_poll(payload.message_id)
 
     async def cog_command_error(self, ctx, error: Exception) -> None:
         logger.error(f"Error occurred in command {ctx.command}: {error}")
@@ -537,12 +944,18 @@ class Event(commands.Cog):
         await ctx.send(embed=embed)
 
     async def add_players_to_poll(self, poll_result, players):
+        """
+        Inscrit les joueurs sur le sondage Framadate afin de pouvoir suivre leurs votes.
+        :param poll_result: Dictionnaire contenant les informations du sondage
+        :param players: Noms des joueurs
+        :return: Résultat de l'inscription (joueurs inscrits, en échec et durée)
+        """
         logger.info(f"Adding players to poll {poll_result['admin_url']}.")
         choices = {}
         for i in range(poll_result['choices_count']):
             choices[f'choices[{i}]'] = ' '
-        for player in players:
-            await self.framadate.add_player(poll_result['admin_url'], player, poll_result['control_token'], choices)
+        return await self.framadate.add_players(poll_result['admin_url'], players, poll_result['control_token'],
+                                                choices)
 
     @commands.hybrid_command(name="pick", with_app_command=True, aliases=['pi'],
                              description="Propose plusieurs dates aux utilisateurs possedant un meme role",
@@ -551,8 +964,10 @@ class Event(commands.Cog):
     @app_commands.describe(days="Le nombre de jours proposés dans le sondage. Par défault: 7.")
     @app_commands.describe(delay="Determine le premier jour proposé dans le sondage. Par défault: 0 (soit aujourd'hui)")
     @app_commands.describe(reminders="Si True, le bot envoie des rappels toutes les 24h aux joueurs n'ayant pas votés")
+    @app_commands.describe(buttons="Si True, les votes se font par boutons plutôt que par réactions")
     @app_commands.guild_only()
-    async def pick(self, ctx, role: discord.Role, days: int = 7, delay: int = 0, reminders: bool = True):
+    async def pick(self, ctx, role: discord.Role, days: int = 7, delay: int = 0, reminders: bool = True,
+                   buttons: bool = False):
         logger.info(f"Creating pick poll for role {role.name} with {days} days and {delay} days delay.")
         poll_author = ctx.author.display_name
         resp_message = await ctx.send(f"Bien reçu {poll_author}, je crée ton sondage pour la table {role.mention} !")
@@ -580,7 +995,20 @@ class Event(commands.Cog):
             date_name = f'{self.NB_EMOJIS[i]} - ' + (now + timedelta(days=i)).strftime("%A %d %B %Y").title()
             embed.add_field(name=date_name, value=f'Votes: 0/{len(mentions)}', inline=True)
 
+        members = [member.id for member in role.members if not member.bot]
+        if buttons:
+            view = discord.ui.View(timeout=None)
+            for i in range(days):
+                view.add_item(PickVoteButton(i, label=(now + timedelta(days=i)).strftime("%a %d").title(),
+                                             emoji=self.NB_EMOJIS[i]))
+            message = await ctx.send(f'{mentions_str}, vous etes conviés à la table {role.mention} !', embed=embed,
+                                     view=view)
+            self.track_pick_poll(PickPoll.from_embed(message, role.name, embed, members, send_reminders=reminders,
+                                                     buttons=True))
+            return await resp_message.delete()
+
         message = await ctx.send(f'{mentions_str}, vous etes conviés à la table {role.mention} !', embed=embed)
+        self.track_pick_poll(PickPoll.from_embed(message, role.name, embed, members, send_reminders=reminders))
         for emoji in self.NB_EMOJIS[:days]:
             await message.add_reaction(emoji)
         await resp_message.delete()
@@ -593,8 +1021,10 @@ class Event(commands.Cog):
     @app_commands.describe(days="Le nombre de jours proposés dans le sondage. Par défault: 7.")
     @app_commands.describe(delay="Determine le premier jour proposé dans le sondage. Par défault: 0 (soit aujourd'hui)")
     @app_commands.describe(reminders="Si True, le bot envoie des rappels toutes les 24h aux joueurs n'ayant pas votés")
+    @app_commands.describe(backend="Framadate, ou un sondage Discord natif (10 jours maximum). Par défault: framadate")
     @app_commands.guild_only()
-    async def date_poll(self, ctx, role: discord.Role, days: int = 7, delay: int = 0, reminders: bool = True):
+    async def date_poll(self, ctx, role: discord.Role, days: int = 7, delay: int = 0, reminders: bool = True,
+                        backend: Literal['framadate', 'discord'] = FRAMADATE_BACKEND):
         logger.info(f"Creating date poll for role {role.name} with {days} days and {delay} days delay.")
         poll_author = ctx.author.display_name
         email = "jenaipas@de.email"
@@ -605,10 +1035,14 @@ class Event(commands.Cog):
 
         resp_message = await ctx.send(f"Bien reçu {poll_author}, je crée ton sondage pour la table {role.mention} !")
 
-        players = [member.display_name for member in role.members if not member.bot]
+        player_ids = {member.display_name: member.id for member in role.members if not member.bot}
+        players = list(player_ids)
         title = f'Session pour la table {role}'
+        if backend == self.DISCORD_BACKEND:
+            return await self.native_date_poll(ctx, role, days, delay, reminders, title, player_ids, end_date,
+                                               resp_message)
 
-        poll_result = self.framadate.create_date_poll(
+        poll_result = await self.framadate.create_date_poll_async(
             poll_author=poll_author,
             title=title,
             description=f"Quelles sont vos dispos pour la prochaine session de {role} ? 🎲",
@@ -618,18 +1052,31 @@ class Event(commands.Cog):
             end_date=end_date
         )
         if not poll_result:
+            await resp_message.delete()
             return await self.send_error_embed(ctx, "Impossible de créer le sondage.")
 
         poll_result['players_count'] = len(players)
+        poll_result['player_ids'] = player_ids
         poll_result['role_id'] = role.id
         poll_result['creator_id'] = ctx.author.id
+        poll_result['gm_name'] = poll_author if poll_author in players else None
         poll_result['channel_id'] = ctx.channel.id
         poll_result['guild_id'] = ctx.guild.id
         poll_result['send_reminders'] = True if reminders else False
         poll_result['reminder_count'] = 0
         poll_result['last_channel_notification'] = None
 
-        asyncio.create_task(self.add_players_to_poll(poll_result, players))
+        registration = await self.add_players_to_poll(poll_result, players)
+        if registration['failed']:
+            await resp_message.delete()
+            error = f"Impossible d'inscrire {', '.join(registration['failed'])} au sondage, il ne sera pas suivi."
+            try:
+                await ctx.author.send(f"Le sondage Framadate a tout de même été créé, tu peux le supprimer depuis sa "
+                                      f"page d'administration : {poll_result['admin_url']}")
+                error += " Le lien d'administration du sondage t'a été envoyé en privé pour le supprimer."
+            except discord.HTTPException as e:
+                logger.warning(f"Failed to send the admin URL of {poll_result['admin_url']} to {ctx.author}: {e}")
+            return await self.send_error_embed(ctx, error)
 
         try:
             message_admin = random.choice(ADMIN_MESSAGES)
@@ -639,13 +1086,10 @@ class Event(commands.Cog):
                 f"Impossible d'envoyer le lien d'administration en privé, assurez-vous que vos DMs sont ouverts. "
                 f"Erreur: {e}")
 
-        for member in role.members:
-            if member != ctx.author and not member.bot:
-                try:
-                    msg_pc = random.choice(PC_MESSAGES)
-                    await member.send(msg_pc.format(member.mention, poll_result['public_url']))
-                except discord.HTTPException:
-                    continue
+        self.outbox.send_many(
+            [(member.id, random.choice(PC_MESSAGES).format(member.mention, poll_result['public_url']))
+             for member in role.members if member != ctx.author and not member.bot],
+            batch=f"invite-{poll_result['admin_url']}")
 
         mentions_str = ', '.join(member.mention for member in role.members if not member.bot)
         embed = discord.Embed(
@@ -675,6 +1119,67 @@ class Event(commands.Cog):
         self.save_poll_info(title, poll_result)
         await resp_message.delete()
 
+    async def native_date_poll(self, ctx, role, days, delay, reminders, title, player_ids, end_date, resp_message):
+        """
+        Crée le sondage de dates sous forme de sondage natif Discord (une réponse par jour, choix multiples). Il est
+        ensuite suivi comme un sondage Framadate : mêmes rappels, même recherche de date et même clôture.
+        :param ctx: Contexte de la commande
+        :param role: Rôle des joueurs invités
+        :param days: Nombre de jours proposés
+        :param delay: Nombre de jours avant le premier jour proposé
+        :param reminders: Si True, des rappels sont envoyés aux joueurs n'ayant pas voté
+        :param title: Titre du sondage
+        :param player_ids: Dictionnaire {nom du joueur: identifiant du membre}
+        :param end_date: Date de fin du sondage au format dd/mm/yyyy
+        :param resp_message: Message d'attente à supprimer
+        :return:
+        """
+        if days <= 0 or days > self.NATIVE_POLL_MAX_ANSWERS:
+            await resp_message.delete()
+            return await self.send_error_embed(
+                ctx, f'"days" parameter must be between 1 and {self.NATIVE_POLL_MAX_ANSWERS} for a discord poll.')
+
+        start = datetime.now(tz=pytz.timezone(self.TIMEZONE_STR)) + timedelta(days=delay)
+        poll = discord.Poll(question=f"Quelles sont vos dispos pour la prochaine session de {role} ? 🎲",
+                            duration=timedelta(hours=min(24 * (days + delay), self.NATIVE_POLL_MAX_HOURS)),
+                            multiple=True)
+        slots = []
+        for i in range(days):
+            day = start + timedelta(days=i)
+            poll.add_answer(text=day.strftime("%A %d %B").title(), emoji=self.NB_EMOJIS[i])
+            slots.append(day.strftime(self.POLL_DATE_FORMAT))
+
+        mentions_str = ', '.join(f'<@{member_id}>' for member_id in player_ids.values())
+        message = await ctx.send(content=random.choice(CALL_TO_VOTE_MESSAGE).format(mentions_str), poll=poll)
+        self.outbox.send_many(
+            [(member_id, random.choice(PC_MESSAGES).format(f'<@{member_id}>', message.jump_url))
+             for member_id in player_ids.values() if member_id != ctx.author.id],
+            batch=f'invite-{message.id}')
+
+        poll_result = {
+            'backend': self.DISCORD_BACKEND,
+            'answers': {answer.id: slot for answer, slot in zip(message.poll.answers, slots)},
+            'admin_url': None,
+            'public_url': message.jump_url,
+            'choices_count': days,
+            'expire_at': end_date,
+            'players_count': len(player_ids),
+            'player_ids': player_ids,
+            'role_id': role.id,
+            'creator_id': ctx.author.id,
+            'gm_name': ctx.author.display_name if ctx.author.display_name in player_ids else None,
+            'channel_id': ctx.channel.id,
+            'guild_id': ctx.guild.id,
+            'send_reminders': True if reminders else False,
+            'reminder_count': 0,
+            'last_channel_notification': None,
+            'jump_url': message.jump_url,
+            'message_id': message.id,
+        }
+        self.save_poll_info(title, poll_result)
+        await resp_message.delete()
+
 
 async def setup(bot):
+    bot.add_dynamic_items(PickVoteButton)
     await bot.add_cog(Event(bot))
@@ -1,7 +1,10 @@
+import time
 import asyncio
 import itertools
 import logging
-from functools import partial
+import threading
+from collections import deque
+from typing import Literal
 
 import discord
 import validators
@@ -13,29 +16,29 @@ from discord.ext.commands.errors import CommandInvokeError
 from discord.ui import Button, View
 from youtube_search import YoutubeSearch
 
-from exceptions import VoiceConnectionError, InvalidVoiceChannel
+from exceptions import VoiceConnectionError, InvalidVoiceChannel, ExtractionQueueFull
+from cogs.services.extraction_service import ExtractionService
+from cogs.services.extraction_cache import ExtractionCache
 
 
 logger = logging.getLogger(__name__)
 
 class YTDLChoiceButton(Button):
-    def __init__(self, label: int, cog, ctx, url_suffix: str, embed: Embed):
+    def __init__(self, label: int, cog, ctx, result: dict, embed: Embed):
         super().__init__(label=str(label), style=discord.ButtonStyle.primary, custom_id=f'ytdl_choice_btn_{label}')
         self.ctx = ctx
         self.cog = cog
-        self.url_suffix = url_suffix
+        self.result = result
         self.embed = embed
 
     async def callback(self, interaction):
-        logger.info(f"Button {self.label} clicked for URL: {self.url_suffix}")
+        logger.info(f"Button {self.label} clicked for URL: {self.result['url_suffix']}")
         await interaction.response.defer()
-        url = f'https://www.youtube.com{self.url_suffix}'
         player = self.cog.get_player(self.ctx)
-        source = YTDLSource(self.ctx.author)
+        source = YTDLSource.from_search_result(self.ctx.author, self.result)
         await interaction.message.delete()
-        await source.create_source(url, bot=self.cog.bot)
         await self.cog.send_source_embed(self.ctx, source, "Put at the end of the queue 📀")
-        await player.queue.put(source)
+        player.enqueue(source)
         logger.info(f"Added {source.title} to queue.")
 
 
@@ -63,44 +66,174 @@ class YTDL(object):
         'options': '-vn'
     }
 
-    youtube_dl = youtube_dl.YoutubeDL(ytdl_format_options)
-
 
 class YTDLSource(object):
+    REFRESH_MARGIN = 10 * 60  # secondes
+
     def __init__(self, requester):
         self.requester = requester
         self.title = None
         self.url = None
         self.webpage_url = None
         self.duration = None
+        self.seconds = 0
+        self.expires_at = None
         self.data = None
 
-    async def create_source(self, search, bot):
+    @classmethod
+    def from_search_result(cls, requester, result):
+        """
+        Cree un morceau a partir d'un resultat de recherche YouTube, sans extraction : le flux audio est resolu au
+        moment de le jouer.
+        :param requester: Membre ayant demande le morceau
+        :param result: Resultat de YoutubeSearch
+        :return: Morceau
+        """
+        source = cls(requester)
+        source.title = result['title']
+        source.webpage_url = f'https://www.youtube.com{result["url_suffix"]}'
+        source.seconds = cls.parse_duration(result.get('duration'))
+        source.duration = MusicPlayer.get_str_duration(source.seconds)
+        return source
+
+    @staticmethod
+    def parse_duration(duration):
+        """
+        :param duration: Duree au format "[h:]mm:ss", ou en secondes
+        :return: Duree en secondes
+        """
+        if isinstance(duration, (int, float)):
+            return int(duration)
+        parts = str(duration or '').split(':')
+        if not all(part.isdigit() for part in parts):
+            return 0
+        return sum(int(part) * 60 ** i for i, part in enumerate(reversed(parts)))
+
+    def needs_stream(self, margin=0):
+        """
+        :param margin: Duree, en secondes, pendant laquelle l'URL du flux doit encore rester valide
+        :return: True si l'URL du flux est inconnue ou expire dans moins de `margin` secondes
+        """
+        return self.url is None or self.expires_at is None or self.expires_at <= time.time() + margin
+
+    async def resolve_stream(self, resolver, margin=0):
+        """
+        Resout l'URL du flux audio si elle est inconnue ou proche de son expiration.
+        :param resolver: Cache des extractions
+        :param margin: Duree, en secondes, pendant laquelle l'URL du flux doit encore rester valide
+        :return:
+        """
+        if self.needs_stream(margin):
+            await self.create_source(self.webpage_url, resolver, min_ttl=margin)
+
+    async def create_source(self, search, resolver, need_stream=True, min_ttl=0):
         logger.info(f"Creating source for search: {search}")
         try:
-            loop = bot.loop or asyncio.get_event_loop()
-            to_run = partial(YTDL.youtube_dl.extract_info, url=search, download=False)
-            data = await loop.run_in_executor(None, to_run)
+            data = await resolver.resolve(search, need_stream, min_ttl)
         except DownloadError:
             logger.error(f"DownloadError: Youtube did not accept the request for {search}.")
             raise DownloadError("Youtube did not accept the request. Please retry.")
-
-        if 'entries' in data:
-            data = data['entries'][0]
+        except asyncio.TimeoutError:
+            raise DownloadError("Youtube took too long to answer. Please retry.")
 
         self.title = data.get('title')
         self.url = data.get('url')
         self.webpage_url = data.get('webpage_url')
-        self.duration = MusicPlayer.get_str_duration(data.get('duration'))
+        self.seconds = int(data.get('duration') or 0)
+        self.duration = MusicPlayer.get_str_duration(self.seconds)
+        self.expires_at = data.get('expires_at')
         logger.info(f"Source created: {self.title}, {self.url}")
 
 
+class ChainedAudioSource(discord.AudioSource):
+    """
+    Source audio qui enchaine les morceaux : lorsque le morceau en cours se termine, la trame suivante est lue dans
+    le decodeur deja lance du morceau suivant, sans attendre la boucle du lecteur. Mesure l'intervalle entre la
+    derniere trame d'un morceau et la premiere du suivant.
+    """
+    FRAME_MS = 20
+
+    def __init__(self, player, source, audio):
+        self.player = player
+        self.loop = asyncio.get_running_loop()
+        self.source = source
+        self.audio = audio
+        self.frames = 0
+        self.starting = True
+        self.lock = threading.Lock()
+        self.next_source = None
+        self.next_audio = None
+        self.next_frame = None
+        self.pending = None
+        self.settled = False
+        self.replay = False
+        self.handed_over = asyncio.Event()
+
+    def chain(self, source, audio, frame):
+        with self.lock:
+            self.next_source, self.next_audio, self.next_frame = source, audio, frame
+
+    def handover(self):
+        with self.lock:
+            if self.next_audio is None:
+                return b''
+            previous = self.audio
+            self.source, self.audio, frame = self.next_source, self.next_audio, self.next_frame
+            self.next_source = self.next_audio = self.next_frame = None
+        self.frames = 0
+        self.starting = True
+        self.loop.call_soon_threadsafe(self.handed_over.set)
+        self.loop.call_soon_threadsafe(self.loop.run_in_executor, None, previous.cleanup)
+        return frame
+
+    def release_next(self):
+        with self.lock:
+            next_audio = self.next_audio
+            self.next_source = self.next_audio = self.next_frame = None
+        if next_audio:
+            next_audio.cleanup()
+
+    def read(self):
+        frame = self.audio.read()
+        if not frame:
+            frame = self.handover()
+            if not frame:
+                return b''
+        now = time.monotonic()
+        if self.starting and self.player.last_frame_at is not None:
+            self.player.record_gap((now - self.player.last_frame_at) * 1000 - self.FRAME_MS)
+        self.starting = False
+        self.frames += 1
+        self.player.last_frame_at = now
+        return frame
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        self.audio.cleanup()
+        self.release_next()
+
+
 class MusicPlayer(object):
+    REPEAT_TRACK = 'track'
+    REPEAT_QUEUE = 'queue'
+    GAPLESS = False
+    PRELOAD_SECONDS = 5
+    GAP_HISTORY = 50
+
     def __init__(self, ctx):
         self.ctx = ctx
         self.queue = asyncio.Queue()
         self.next = asyncio.Event()
         self.current = None
+        self.repeat_mode = None
+        self.repeats = 0
+        self.cycle_start = None
+        self.prefetch_task = None
+        self.gapless = self.GAPLESS
+        self.gaps = deque(maxlen=self.GAP_HISTORY)
+        self.last_frame_at = None
         self.loop = ctx.bot.loop.create_task(self.player_loop())
         self.display_playing = True
         logger.info(f"MusicPlayer created for guild {ctx.guild.id}.")
@@ -116,36 +249,213 @@ class MusicPlayer(object):
             return "%dh %02dm %02ds" % (hour, minutes, seconds)
         return "%02dm %02ds" % (minutes, seconds)
 
+    def set_repeat(self, mode, repeats):
+        """
+        Repete le morceau en cours (mode track) ou toute la queue, morceau en cours compris (mode queue).
+        :param mode: REPEAT_TRACK, REPEAT_QUEUE, ou None pour arreter la repetition
+        :param repeats: Nombre de repetitions
+        :return:
+        """
+        self.repeat_mode = mode if repeats else None
+        self.repeats = repeats if mode else 0
+        self.cycle_start = self.current
+        logger.info(f"Repeat mode set to {self.repeat_mode} for {self.repeats} times in guild {self.ctx.guild.id}.")
+
+    def after_track(self, source):
+        """
+        :param source: Morceau qui vient de se terminer
+        :return: Le morceau a rejouer immediatement, ou None pour passer au suivant dans la queue
+        """
+        if self.repeat_mode == self.REPEAT_TRACK and self.repeats > 0:
+            self.repeats -= 1
+            return source
+        if self.repeat_mode == self.REPEAT_QUEUE and self.repeats > 0:
+            self.queue.put_nowait(source)
+            return None
+        self.repeat_mode = None
+        return None
+
+    def enqueue(self, source):
+        self.queue.put_nowait(source)
+        if self.current is not None and self.queue.qsize() == 1:
+            self.prefetch()
+
+    def upcoming(self):
+        """
+        :return: Le prochain morceau qui sera joue, ou None s'il n'est pas encore connu
+        """
+        if self.repeat_mode == self.REPEAT_TRACK and self.repeats > 0:
+            return self.current
+        return self.queue._queue[0] if self.queue.qsize() else None
+
+    def prefetch(self):
+        """
+        Resout en arriere-plan le flux du prochain morceau pendant que le morceau en cours est joue. Le flux doit
+        rester valide jusqu'a la fin du prochain morceau, sinon il est resolu a nouveau.
+        """
+        source = self.upcoming()
+        if source is None:
+            return
+        margin = (self.current.seconds if self.current else 0) + source.seconds + YTDLSource.REFRESH_MARGIN
+        if not source.needs_stream(margin):
+            return
+        if self.prefetch_task and not self.prefetch_task.done():
+            self.prefetch_task.cancel()
+        self.prefetch_task = asyncio.create_task(self._prefetch(source, margin))
+
+    async def _prefetch(self, source, margin):
+        try:
+            await source.resolve_stream(self.ctx.cog.resolver, margin)
+            logger.info(f"Prefetched stream of {source.title}.")
+        except Exception as e:
+            logger.warning(f"Could not prefetch stream of {source.title}: {e}")
+
+    def dequeued(self, source):
+        if self.repeat_mode == self.REPEAT_QUEUE and source is self.cycle_start:
+            self.repeats -= 1
+        return source
+
+    def record_gap(self, gap):
+        self.gaps.append(gap)
+        logger.info(f"Inter-track gap of {gap:.1f}ms in guild {self.ctx.guild.id} "
+                    f"({'gapless' if self.gapless else 'standard'} mode).")
+
+    @staticmethod
+    def open_audio(source):
+        """
+        Lance le decodage FFmpeg d'un morceau et attend sa premiere trame, afin que le morceau puisse etre joue sans
+        delai. Bloquant : a executer hors de la boucle d'evenements.
+        :param source: Morceau dont le flux est resolu
+        :return: Tuple (source audio, premiere trame)
+        """
+        audio = discord.PCMVolumeTransformer(discord.FFmpegPCMAudio(source.url, **YTDL.ffmpeg_options), volume=.5)
+        frame = audio.read()
+        if not frame:
+            audio.cleanup()
+            raise DownloadError(f"FFmpeg did not produce any audio for {source.title}.")
+        return audio, frame
+
+    async def preload(self, chain, source):
+        """
+        Peu avant la fin du morceau en cours, choisit le morceau suivant, lance son decodage et l'enchaine au morceau
+        en cours.
+        :param chain: Source audio jouee par le client vocal
+        :param source: Morceau en cours
+        :return:
+        """
+        if not source.seconds:
+            return
+        while chain.frames * ChainedAudioSource.FRAME_MS / 1000 < source.seconds - self.PRELOAD_SECONDS:
+            await asyncio.sleep(.5)
+
+        upcoming = self.after_track(source)
+        chain.settled = True
+        chain.replay = upcoming is not None
+        while upcoming is None:
+            if self.queue.qsize():
+                upcoming = self.dequeued(self.queue.get_nowait())
+            else:
+                await asyncio.sleep(.5)
+        chain.pending = upcoming
+
+        try:
+            await upcoming.resolve_stream(self.ctx.cog.resolver, upcoming.seconds)
+            future = asyncio.get_running_loop().run_in_executor(None, self.open_audio, upcoming)
+            try:
+                audio, frame = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                future.add_done_callback(lambda f: f.exception() is None and f.result()[0].cleanup())
+                raise
+        except Exception as e:
+            logger.warning(f"Could not preload {upcoming.title}, it will be started after the current track: {e}")
+            return
+        chain.chain(upcoming, audio, frame)
+        logger.info(f"Preloaded {upcoming.title} for a gapless transition.")
+
+    async def play_chain(self, chain, source):
+        """
+        Joue les morceaux enchaines sans interruption tant que le morceau suivant est precharge a temps.
+        :param chain: Source audio jouee par le client vocal
+        :param source: Premier morceau de la chaine
+        :return: Le prochain morceau a jouer une fois la chaine interrompue, ou None pour passer au suivant dans la
+        queue
+        """
+        while True:
+            preload = asyncio.create_task(self.preload(chain, source))
+            waiters = [asyncio.create_task(chain.handed_over.wait()), asyncio.create_task(self.next.wait())]
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            for task in [preload, *waiters]:
+                task.cancel()
+
+            if chain.handed_over.is_set():
+                chain.handed_over.clear()
+                chain.pending = None
+                chain.settled = False
+                chain.replay = False
+                source = self.current = chain.source
+                self.prefetch()
+                if self.display_playing:
+                    await self.ctx.cog.send_source_embed(self.ctx, source, embed_title="Now Playing !!!🎶")
+                continue
+
+            self.current = None
+            chain.release_next()
+            if not chain.settled:
+                return self.after_track(source)
+            if chain.replay and self.repeat_mode != self.REPEAT_TRACK:
+                return None
+            return chain.pending
+
     async def player_loop(self):
         await self.ctx.bot.wait_until_ready()
 
+        source = None
         while not self.ctx.bot.is_closed():
             self.next.clear()
-            logger.info("Waiting for next song to play...")
-            try:
-                async with asyncio.timeout(20):
-                    source = await self.queue.get()
-            except asyncio.TimeoutError:
-                logger.warning(f"Timeout, stopping the player for guild {self.ctx.guild.id}.")
-                return self.destroy(self.ctx.guild)
+            if source is None:
+                logger.info("Waiting for next song to play...")
+                if self.queue.empty():
+                    self.last_frame_at = None
+                try:
+                    async with asyncio.timeout(20):
+                        source = self.dequeued(await self.queue.get())
+                except asyncio.TimeoutError:
+                    logger.warning(f"Timeout, stopping the player for guild {self.ctx.guild.id}.")
+                    return self.destroy(self.ctx.guild)
+
+            if source.needs_stream(source.seconds):
+                logger.info(f"Stream of {source.title} is not resolved yet, resolving it now.")
+                try:
+                    await source.resolve_stream(self.ctx.cog.resolver, source.seconds)
+                except Exception as e:
+                    logger.error(f"Could not resolve {source.title}, skipping it: {e}")
+                    if self.display_playing:
+                        await self.ctx.cog.send_error_embed(self.ctx, f"Could not play {source.title}: {e}")
+                    source = None
+                    continue
 
             self.current = source
+            audio = discord.PCMVolumeTransformer(discord.FFmpegPCMAudio(source.url, **YTDL.ffmpeg_options), volume=.5)
+            chain = ChainedAudioSource(self, source, audio)
             self.ctx.guild.voice_client.play(
-                discord.FFmpegPCMAudio(source.url, **YTDL.ffmpeg_options),
+                chain,
                 after=lambda _: self.ctx.bot.loop.call_soon_threadsafe(self.next.set)
             )
-            self.ctx.guild.voice_client.source = discord.PCMVolumeTransformer(
-                self.ctx.guild.voice_client.source
-            )
-            self.ctx.guild.voice_client.source.volume = .5
+            self.prefetch()
             if self.display_playing:
                 await self.ctx.cog.send_source_embed(self.ctx, source, embed_title="Now Playing !!!🎶")
 
-            await self.next.wait()
-            self.current = None
+            if self.gapless:
+                source = await self.play_chain(chain, source)
+            else:
+                await self.next.wait()
+                self.current = None
+                source = self.after_track(source)
 
     def destroy(self, guild):
         logger.info(f"Destroying player for guild {guild.id}.")
+        if self.prefetch_task:
+            self.prefetch_task.cancel()
         return self.ctx.bot.loop.create_task(self.ctx.cog.cleanup(guild))
 
 
@@ -158,8 +468,21 @@ class Music(commands.Cog):
         self.bot = bot
         self.queue = {}
         self.players = {}
+        self.extractor = ExtractionService(YTDL.ytdl_format_options)
+        self.resolver = ExtractionCache(self.extractor)
         logger.info("Music cog has been initialized.")
 
+    def cog_unload(self):
+        self.extractor.close()
+
+    def log_gap_stats(self):
+        for guild_id, player in self.players.items():
+            if player.gaps:
+                average = sum(player.gaps) / len(player.gaps)
+                logger.info(f"Inter-track gaps in guild {guild_id}: average {average:.1f}ms, "
+                            f"max {max(player.gaps):.1f}ms over the last {len(player.gaps)} transitions "
+                            f"({'gapless' if player.gapless else 'standard'} mode).")
+
     @commands.Cog.listener()
     async def on_ready(self):
         logger.info('Music cog is ready')
@@ -186,7 +509,7 @@ class Music(commands.Cog):
                 await self.send_error_embed(ctx, "This command cannot be used in Private Messages.")
             except discord.HTTPException as e:
                 logger.error(f"HTTPException while sending error embed: {e}")
-        elif isinstance(error, InvalidVoiceChannel):
+        elif isinstance(error, (InvalidVoiceChannel, ExtractionQueueFull)):
             await self.send_error_embed(ctx, str(error))
         elif isinstance(error, commands.CommandInvokeError):
             original_error = getattr(error, 'original', None)
@@ -248,7 +571,7 @@ class Music(commands.Cog):
 
         view = View()
         for i, result in enumerate(results):
-            btn = YTDLChoiceButton(int(i+1), self, ctx, result['url_suffix'], embed)
+            btn = YTDLChoiceButton(int(i+1), self, ctx, result, embed)
             view.add_item(btn)
 
         await ctx.send(embed=embed, view=view)
@@ -256,12 +579,14 @@ class Music(commands.Cog):
 
 
     @commands.hybrid_command(name='loop', with_app_command=True, aliases=['lp', 'repeat'],
-                             brief='Loop sur le morceau en cours',
-                             description='Met le morceau en cours en loop pour n répétitions. (maximum 10 fois)')
-    @app_commands.describe(rep='Nombre de répétitions')
+                             brief='Loop sur le morceau en cours ou sur la queue',
+                             description='Met le morceau en cours, ou toute la queue, en loop pour n répétitions. '
+                                         '(maximum 10 fois)')
+    @app_commands.describe(rep='Nombre de répétitions',
+                           mode='Répéter le morceau en cours (track) ou la queue (queue)')
     @app_commands.guild_only()
-    async def loop(self, ctx, rep: int):
-        logger.info(f"Loop command invoked with {rep} repetitions.")
+    async def loop(self, ctx, rep: int, mode: Literal['track', 'queue'] = MusicPlayer.REPEAT_TRACK):
+        logger.info(f"Loop command invoked with {rep} repetitions in {mode} mode.")
         if not ctx.interaction:
             await ctx.message.delete()
 
@@ -276,13 +601,11 @@ class Music(commands.Cog):
         rep = rep if rep <= 10 else 10
         player = self.get_player(ctx)
 
-        await self.send_source_embed(ctx, player.current, f"Looping over the track for {rep} times 🔄")
-
-        for _ in range(rep):
-            source = YTDLSource(ctx.author)
-            await source.create_source(player.current.webpage_url, bot=self.bot)
-            await player.queue.put(source)
-        logger.info(f"Track set to loop for {rep} repetitions.")
+        player.set_repeat(mode, rep)
+        if mode == MusicPlayer.REPEAT_QUEUE:
+            await self.send_source_embed(ctx, player.current, f"Looping over the queue for {rep} times 🔁")
+        else:
+            await self.send_source_embed(ctx, player.current, f"Looping over the track for {rep} times 🔄")
 
     @commands.hybrid_command(name='play', with_app_command=True, aliases=['search', 'pl'],
                              brief="Lance ou met en queue un morceau",
@@ -304,9 +627,9 @@ class Music(commands.Cog):
         if validators.url(search):
             player = self.get_player(ctx)
             source = YTDLSource(ctx.author)
-            await source.create_source(search, bot=self.bot)
+            await source.create_source(search, self.resolver, need_stream=False)
             await self.send_source_embed(ctx, source, "Put at the end of the queue 📀")
-            await player.queue.put(source)
+            player.enqueue(source)
             logger.info(f"Added URL to queue: {search}")
         else:
             if not all(c.isalnum() or c.isspace() for c in search):
@@ -373,6 +696,8 @@ class Music(commands.Cog):
             '__Now Playing__',
             await self.get_source_string(player.current),
         ])
+        if player.repeat_mode:
+            np += f'\n`Repeat:` {player.repeat_mode} ({player.repeats} left)'
 
         if player.queue.empty():
             sources = 'Nothing in queue'
@@ -392,6 +717,20 @@ class Music(commands.Cog):
         await ctx.send(embed=embed)
         logger.info(f"Queue information sent for guild {ctx.guild.id}.")
 
+    @commands.hybrid_command(name='gapless', with_app_command=True, aliases=['gl'],
+                             brief="Active ou désactive l'enchaînement sans blanc des morceaux",
+                             description="Active ou désactive l'enchaînement sans blanc des morceaux : le morceau "
+                                         "suivant est préchargé quelques secondes avant la fin du morceau en cours.")
+    @app_commands.describe(enabled="Activer (True) ou désactiver (False) l'enchaînement sans blanc")
+    @app_commands.guild_only()
+    async def gapless(self, ctx, enabled: bool):
+        logger.info(f"Gapless command invoked with enabled={enabled} in guild {ctx.guild.id}")
+        if not ctx.interaction:
+            await ctx.message.delete()
+        player = self.get_player(ctx)
+        player.gapless = enabled
+        await ctx.send(f"**Gapless mode {'enabled' if enabled else 'disabled'}** {'⏩' if enabled else '⏹'}")
+
     @commands.hybrid_command(name='np', with_app_command=True, aliases=['song', 'current', 'playing'],
                              brief="Affiche le morceau en cours", description="Affiche le morceau en cours.")
     @app_commands.guild_only()
@@ -441,6 +780,8 @@ class Music(commands.Cog):
                 await self.send_source_embed(ctx, player.current, embed_title="Skipping ⏭")
                 logger.info(f"Skipping track: {player.current.title} in guild {ctx.guild.id}")
             skipped_url = player.current.webpage_url
+            if player.repeat_mode == MusicPlayer.REPEAT_TRACK:
+                player.set_repeat(None, 0)
             vc.stop()
             await asyncio.sleep(0.1)
         player.display_playing = True
@@ -0,0 +1,170 @@
+import time
+import asyncio
+import logging
+
+import discord
+
+
+logger = logging.getLogger(__name__)
+
+
+class RateBucket(object):
+    """
+    Seau a jetons : autorise `capacity` requetes par fenetre de `per` secondes, avec un remplissage continu.
+    """
+
+    def __init__(self, capacity, per):
+        self.capacity = capacity
+        self.per = per
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / self.per)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * self.per / self.capacity)
+
+
+class DMOutbox(object):
+    """
+    File d'envoi des messages prives. Les messages sont enregistres dans la base de suivi avant d'etre envoyes, et
+    ne sont supprimes qu'une fois delivres : un redemarrage reprend les envois en attente. Un groupe de workers
+    envoie les messages en respectant les limites de debit de Discord (globale, ouverture des channels prives et
+    envoi par channel), avec un cache des channels prives et des nouvelles tentatives espacees en cas d'erreur.
+    """
+    WORKERS = 4
+    MAX_ATTEMPTS = 5
+    RETRY_DELAY = 2  # secondes, double a chaque tentative
+
+    GLOBAL_RATE = (50, 1)  # requetes, secondes
+    OPEN_DM_RATE = (5, 5)
+    CHANNEL_RATE = (5, 5)
+
+    def __init__(self, bot, store, workers=WORKERS):
+        """
+        :param bot: Bot Discord
+        :param store: Base de suivi des sondages, qui persiste les messages en attente
+        :param workers: Nombre de messages envoyes en parallele
+        """
+        self.bot = bot
+        self.store = store
+        self.queue = asyncio.Queue()
+        self.dm_channels = {}
+        self.global_bucket = RateBucket(*self.GLOBAL_RATE)
+        self.open_dm_bucket = RateBucket(*self.OPEN_DM_RATE)
+        self.channel_buckets = {}
+        self.batches = {}
+        self.stats = {'sent': 0, 'failed': 0, 'retried': 0}
+
+        for dm in store.pending_dms():
+            self._track(dm)
+        if self.queue.qsize():
+            logger.info(f"Resuming {self.queue.qsize()} pending DMs.")
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(workers)]
+
+    def _track(self, dm):
+        batch = self.batches.setdefault(dm['batch'], {'pending': 0, 'sent': 0, 'failed': 0,
+                                                      'created_at': dm['created_at']})
+        batch['pending'] += 1
+        self.queue.put_nowait(dm)
+
+    def send_many(self, messages, batch):
+        """
+        Enregistre un lot de messages prives et les ajoute a la file d'envoi.
+        :param messages: Liste de tuples (identifiant du destinataire, contenu)
+        :param batch: Nom du lot, utilise pour mesurer la duree de sa distribution
+        :return:
+        """
+        if not messages:
+            return
+        created_at = time.time()
+        ids = self.store.enqueue_dms(messages, batch, created_at)
+        for dm_id, (user_id, content) in zip(ids, messages):
+            self._track({'id': dm_id, 'user_id': user_id, 'content': content, 'batch': batch, 'attempts': 0,
+                         'created_at': created_at})
+        logger.info(f"Queued {len(messages)} DMs for batch {batch}.")
+
+    def send(self, user_id, content, batch=None):
+        self.send_many([(user_id, content)], batch or f'dm-{user_id}')
+
+    async def dm_channel(self, user_id):
+        """
+        Retourne le channel prive d'un utilisateur, en ne l'ouvrant qu'une fois.
+        :param user_id: Identifiant de l'utilisateur
+        :return: Channel prive
+        """
+        channel = self.dm_channels.get(user_id)
+        if channel is None:
+            user = self.bot.get_user(user_id)
+            if user is None:
+                await self.global_bucket.acquire()
+                user = await self.bot.fetch_user(user_id)
+            channel = user.dm_channel
+            if channel is None:
+                await self.open_dm_bucket.acquire()
+                await self.global_bucket.acquire()
+                channel = await user.create_dm()
+            self.dm_channels[user_id] = channel
+        return channel
+
+    async def worker(self):
+        await self.bot.wait_until_ready()
+        while True:
+            dm = await self.queue.get()
+            try:
+                await self.deliver(dm)
+            except Exception as e:
+                logger.exception(f"Unexpected error while sending DM {dm['id']}: {e}")
+                self._done(dm, sent=False)
+
+    async def deliver(self, dm):
+        try:
+            channel = await self.dm_channel(dm['user_id'])
+            bucket = self.channel_buckets.get(channel.id)
+            if bucket is None:
+                bucket = self.channel_buckets[channel.id] = RateBucket(*self.CHANNEL_RATE)
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            await channel.send(dm['content'])
+        except (discord.Forbidden, discord.NotFound) as e:
+            logger.warning(f"Cannot send DM to {dm['user_id']}: {e}")
+            self._done(dm, sent=False)
+        except discord.HTTPException as e:
+            dm['attempts'] += 1
+            if dm['attempts'] >= self.MAX_ATTEMPTS:
+                logger.error(f"Giving up DM to {dm['user_id']} after {dm['attempts']} attempts: {e}")
+                self._done(dm, sent=False)
+                return
+            delay = self.RETRY_DELAY * 2 ** (dm['attempts'] - 1)
+            logger.warning(f"Failed to send DM to {dm['user_id']} ({e}), retrying in {delay}s.")
+            self.stats['retried'] += 1
+            self.store.retry_dm(dm['id'])
+            asyncio.get_running_loop().call_later(delay, self.queue.put_nowait, dm)
+        else:
+            self._done(dm, sent=True)
+
+    def _done(self, dm, sent):
+        self.store.remove_dm(dm['id'])
+        self.stats['sent' if sent else 'failed'] += 1
+        batch = self.batches[dm['batch']]
+        batch['pending'] -= 1
+        batch['sent' if sent else 'failed'] += 1
+        if not batch['pending']:
+            del self.batches[dm['batch']]
+            logger.info(f"DM batch {dm['batch']} delivered: {batch['sent']} sent, {batch['failed']} failed in "
+                        f"{time.time() - batch['created_at']:.2f}s.")
+
+    def log_stats(self):
+        logger.info(f"DM outbox stats: {self.stats['sent']} sent, {self.stats['failed']} failed, "
+                    f"{self.stats['retried']} retried, {self.queue.qsize()} queued.")
+
+    def close(self):
+        for worker in self.workers:
+            worker.cancel()
@@ -0,0 +1,122 @@
+import re
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache(object):
+    """
+    Cache LRU des extractions yt-dlp, indexe par identifiant canonique de video. Les metadonnees (titre, duree,
+    URL de la page) sont conservees tant que l'entree n'est pas evincee ; l'URL du flux audio, signee, n'est
+    conservee que jusqu'a son expiration. Les extractions simultanees d'une meme video partagent une seule
+    extraction en cours.
+    """
+    MAX_ENTRIES = 256
+    STREAM_TTL = 60 * 60  # secondes, si l'URL du flux n'indique pas son expiration
+    EXPIRY_MARGIN = 5 * 60  # secondes
+
+    YOUTUBE_ID_REGEX = re.compile(r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/)|youtu\.be/)([\w-]{11})')
+    METADATA_FIELDS = ('id', 'title', 'duration', 'webpage_url')
+
+    def __init__(self, extractor, max_entries=MAX_ENTRIES):
+        """
+        :param extractor: Service d'extraction yt-dlp
+        :param max_entries: Nombre maximal d'entrees conservees
+        """
+        self.extractor = extractor
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.stats = {'hits': 0, 'misses': 0, 'shared': 0, 'stream_refreshes': 0}
+
+    @classmethod
+    def cache_key(cls, url):
+        """
+        :param url: URL demandee
+        :return: Identifiant canonique de la video pour les URL YouTube, l'URL elle-meme sinon
+        """
+        match = cls.YOUTUBE_ID_REGEX.search(url)
+        return f'youtube:{match.group(1)}' if match else url
+
+    @classmethod
+    def stream_expiry(cls, stream_url):
+        """
+        :param stream_url: URL signee du flux audio
+        :return: Timestamp a partir duquel l'URL ne doit plus etre utilisee
+        """
+        expire = parse_qs(urlparse(stream_url or '').query).get('expire')
+        expires_at = int(expire[0]) if expire and expire[0].isdigit() else time.time() + cls.STREAM_TTL
+        return expires_at - cls.EXPIRY_MARGIN
+
+    @property
+    def hit_rate(self):
+        requests = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / requests if requests else 0.0
+
+    @property
+    def bytes_held(self):
+        unique = {id(entry): entry for entry in self.entries.values()}
+        return sum(len(str(value).encode()) for entry in unique.values() for value in entry.values())
+
+    def _get(self, key, need_stream, min_ttl):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        if need_stream and (not entry.get('url') or entry['expires_at'] <= time.time() + min_ttl):
+            self.stats['stream_refreshes'] += 1
+            return None
+        return entry
+
+    def _put(self, keys, entry):
+        for key in keys:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def _extract(self, url, key):
+        data = await self.extractor.extract(url)
+        if 'entries' in data:
+            data = data['entries'][0]
+        entry = {field: data.get(field) for field in self.METADATA_FIELDS}
+        entry['url'] = data.get('url')
+        entry['expires_at'] = self.stream_expiry(entry['url'])
+        canonical = f"{(data.get('extractor_key') or '').lower()}:{data.get('id')}"
+        self._put({key, canonical}, entry)
+        return entry
+
+    async def resolve(self, url, need_stream=True, min_ttl=0):
+        """
+        Retourne les informations d'une video, extraites ou en cache.
+        :param url: URL de la video
+        :param need_stream: Si True, l'URL du flux audio doit etre valide ; sinon les metadonnees suffisent
+        :param min_ttl: Duree minimale, en secondes, pendant laquelle l'URL du flux doit rester valide
+        :return: Dictionnaire contenant l'identifiant, le titre, la duree, l'URL de la page, l'URL du flux et son
+        expiration
+        """
+        key = self.cache_key(url)
+        entry = self._get(key, need_stream, min_ttl)
+        if entry is not None:
+            self.stats['hits'] += 1
+            return entry
+
+        task = self.inflight.get(key)
+        if task is None:
+            self.stats['misses'] += 1
+            task = self.inflight[key] = asyncio.create_task(self._extract(url, key))
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        else:
+            self.stats['shared'] += 1
+            logger.info(f"Sharing in-flight extraction of {key}.")
+        return await asyncio.shield(task)
+
+    def log_stats(self):
+        logger.info(f"Extraction cache stats: {len(self.entries)} entries, {self.bytes_held} bytes, hit rate "
+                    f"{self.hit_rate:.0%}, {self.stats['shared']} shared extractions, "
+                    f"{self.stats['stream_refreshes']} stream refreshes.")
@@ -0,0 +1,102 @@
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import yt_dlp as youtube_dl
+
+from exceptions import ExtractionQueueFull
+
+
+logger = logging.getLogger(__name__)
+
+_worker = threading.local()
+
+
+def _init_worker(options):
+    _worker.ytdl = youtube_dl.YoutubeDL(options)
+
+
+def _extract(url):
+    data = _worker.ytdl.extract_info(url, download=False)
+    return _worker.ytdl.sanitize_info(data)
+
+
+class ExtractionService(object):
+    """
+    Pool dedie aux extractions yt-dlp, separe de l'executor par defaut de la boucle. Chaque worker (thread ou
+    processus) possede sa propre instance de YoutubeDL, qui n'est pas thread-safe. Le nombre d'extractions admises
+    est borne : au-dela, les demandes sont refusees plutot que mises en attente indefiniment.
+    """
+    WORKERS = 4
+    MAX_PENDING = 16
+    TIMEOUT = 30  # secondes
+    USE_PROCESSES = False
+
+    def __init__(self, options, workers=WORKERS, max_pending=MAX_PENDING, timeout=TIMEOUT,
+                 use_processes=USE_PROCESSES):
+        """
+        :param options: Options de YoutubeDL
+        :param workers: Nombre de workers
+        :param max_pending: Nombre maximal d'extractions admises (en cours et en attente d'un worker)
+        :param timeout: Duree maximale d'une extraction, en secondes
+        :param use_processes: Si True, les workers sont des processus plutot que des threads
+        """
+        executor = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self.executor = executor(max_workers=workers, initializer=_init_worker, initargs=(options,))
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self.stats = {'extractions': 0, 'rejected': 0, 'timeouts': 0, 'errors': 0, 'total_latency': 0.0,
+                      'max_latency': 0.0}
+        logger.info(f"Extraction service started with {workers} {'processes' if use_processes else 'threads'}.")
+
+    @property
+    def queue_depth(self):
+        """
+        :return: Nombre d'extractions admises en attente d'un worker
+        """
+        return max(0, self.pending - self.workers)
+
+    def _release(self, started_at, future):
+        self.pending -= 1
+        latency = time.monotonic() - started_at
+        if future.cancelled() or future.exception():
+            self.stats['errors'] += 1
+            return
+        self.stats['extractions'] += 1
+        self.stats['total_latency'] += latency
+        self.stats['max_latency'] = max(self.stats['max_latency'], latency)
+
+    async def extract(self, url):
+        """
+        Extrait les informations d'une video (ou d'une recherche) sans la telecharger.
+        :param url: URL ou recherche
+        :return: Informations extraites par yt-dlp
+        """
+        if self.pending >= self.max_pending:
+            self.stats['rejected'] += 1
+            logger.warning(f"Extraction of {url} rejected, {self.pending} extractions pending.")
+            raise ExtractionQueueFull("Too many tracks are being resolved right now. Please retry in a moment.")
+
+        self.pending += 1
+        future = asyncio.get_running_loop().run_in_executor(self.executor, _extract, url)
+        future.add_done_callback(lambda f, started_at=time.monotonic(): self._release(started_at, f))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            logger.error(f"Extraction of {url} timed out after {self.timeout}s.")
+            raise
+
+    def log_stats(self):
+        done = self.stats['extractions']
+        average = self.stats['total_latency'] / done if done else 0.0
+        logger.info(f"Extraction stats: {done} done, {self.stats['errors']} failed, {self.stats['timeouts']} timed "
+                    f"out, {self.stats['rejected']} rejected, {self.queue_depth} queued, average latency "
+                    f"{average:.2f}s, max {self.stats['max_latency']:.2f}s.")
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,77 @@
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class MemberIndex(object):
+    """
+    Index des membres de chaque guilde par nom affiche, construit a la premiere recherche dans une guilde puis tenu
+    a jour par les evenements de membres (arrivee, depart, changement de surnom) et d'utilisateurs (changement de
+    nom global).
+    """
+
+    def __init__(self):
+        self.guilds = {}
+
+    def _names(self, guild):
+        names = self.guilds.get(guild.id)
+        if names is None:
+            names = self.guilds[guild.id] = {}
+            for member in guild.members:
+                if not member.bot:
+                    names.setdefault(member.display_name, set()).add(member.id)
+            logger.info(f"Indexed {len(guild.members)} members of guild {guild.id}.")
+        return names
+
+    def add(self, member):
+        if member.bot or member.guild.id not in self.guilds:
+            return
+        self.guilds[member.guild.id].setdefault(member.display_name, set()).add(member.id)
+
+    def remove(self, member, display_name=None):
+        """
+        :param member: Membre a retirer de l'index
+        :param display_name: Nom affiche sous lequel le membre est indexe, son nom actuel si None
+        :return:
+        """
+        names = self.guilds.get(member.guild.id)
+        if names is None:
+            return
+        display_name = display_name or member.display_name
+        ids = names.get(display_name)
+        if ids:
+            ids.discard(member.id)
+            if not ids:
+                del names[display_name]
+
+    def update(self, before, after):
+        if before.display_name != after.display_name:
+            self.remove(before, before.display_name)
+            self.add(after)
+
+    def update_user(self, before, member):
+        """
+        Met a jour le nom indexe d'un membre apres un changement de son nom global, qui ne declenche pas d'evenement
+        de membre. Un membre ayant un surnom dans la guilde garde son nom affiche.
+        :param before: Utilisateur avant le changement
+        :param member: Membre de la guilde apres le changement
+        :return:
+        """
+        if not member.nick and before.display_name != member.display_name:
+            self.remove(member, before.display_name)
+            self.add(member)
+
+    def find(self, guild, display_name, role=None):
+        """
+        Cherche un membre d'une guilde par son nom affiche.
+        :param guild: Guilde du membre
+        :param display_name: Nom affiche du membre
+        :param role: Role que le membre doit posseder, ignore si None
+        :return: Membre trouve, ou None
+        """
+        for member_id in self._names(guild).get(display_name, ()):
+            member = guild.get_member(member_id)
+            if member and (role is None or member.get_role(role.id)):
+                return member
+        return None
@@ -0,0 +1,99 @@
+import logging
+
+from cogs.apis.framadate_cache import ExportCache
+from cogs.services.slot_scoring import SlotScorer
+
+
+logger = logging.getLogger(__name__)
+
+
+class NativePollTally(object):
+    """
+    Votes d'un sondage natif Discord (une reponse par creneau, choix multiples), tenus a jour par les evenements
+    de vote et relus sur le message du sondage a la demande. Les votes sont convertis au format des exports
+    Framadate (codes de reponse par creneau) afin d'etre classes et notifies comme les sondages Framadate.
+    """
+
+    def __init__(self, answers):
+        """
+        :param answers: Dictionnaire {identifiant de la reponse: libelle du creneau}
+        """
+        self.answers = {int(answer_id): slot for answer_id, slot in answers.items()}
+        self.order = sorted(self.answers)
+        self.voters = {answer_id: set() for answer_id in self.order}
+        self.changes = 0
+        self.previous = {}
+
+    @property
+    def slots(self):
+        return [self.answers[answer_id] for answer_id in self.order]
+
+    def add_vote(self, answer_id, user_id):
+        voters = self.voters.get(answer_id)
+        if voters is not None and user_id not in voters:
+            voters.add(user_id)
+            self.changes += 1
+
+    def remove_vote(self, answer_id, user_id):
+        voters = self.voters.get(answer_id)
+        if voters is not None and user_id in voters:
+            voters.discard(user_id)
+            self.changes += 1
+
+    def availability(self, player_ids):
+        """
+        Construit les reponses de chaque joueur : "oui" pour les creneaux votes, "non" pour les autres, et aucune
+        reponse pour les joueurs n'ayant pas vote.
+        :param player_ids: Dictionnaire {nom du joueur: identifiant du membre}
+        :return: Dictionnaire {nom du joueur: codes des reponses par creneau}
+        """
+        voted = set().union(*self.voters.values())
+        availability = {}
+        for name, user_id in player_ids.items():
+            if user_id in voted:
+                availability[name] = bytes(SlotScorer.YES if user_id in self.voters[answer_id] else SlotScorer.NO
+                                           for answer_id in self.order)
+            else:
+                availability[name] = bytes(len(self.order))
+        return availability
+
+    def summary(self, player_ids, players_count, scorer, required=()):
+        """
+        Analyse les votes, au meme format que l'analyse d'un export Framadate.
+        :param player_ids: Dictionnaire {nom du joueur: identifiant du membre}
+        :param players_count: Nombre de joueurs
+        :param scorer: Classement des creneaux
+        :param required: Joueurs dont la disponibilite est obligatoire
+        :return: Dictionnaire contenant les votants n'ayant pas répondu, la date choisie, les dates de repli, si tout
+        le monde a répondu et les votes modifies par joueur depuis la precedente analyse ('vote_delta', au meme
+        format que pour les sondages Framadate)
+        """
+        availability = self.availability(player_ids)
+        ranked = scorer.rank(availability, self.slots, players_count, required)
+        non_responders = [name for name, codes in availability.items() if not any(codes)]
+        vote_delta = ExportCache.vote_delta(self.previous, availability, self.slots) if self.changes else {}
+        self.previous, self.changes = availability, 0
+        return {
+            'non_responders': non_responders,
+            'all_responded': not non_responders,
+            'date_found': ranked[0]['slot'] if ranked else None,
+            'alternatives': [slot['slot'] for slot in ranked[1:]],
+            'changed': bool(vote_delta),
+            'vote_delta': vote_delta,
+        }
+
+    @classmethod
+    async def from_message(cls, message, answers):
+        """
+        Relit les votes d'un sondage natif sur son message.
+        :param message: Message du sondage
+        :param answers: Dictionnaire {identifiant de la reponse: libelle du creneau}
+        :return: Votes du sondage
+        """
+        tally = cls(answers)
+        for answer in message.poll.answers:
+            if answer.id in tally.voters:
+                tally.voters[answer.id] = {voter.id async for voter in answer.voters()}
+        tally.changes = sum(len(voters) for voters in tally.voters.values())
+        logger.info(f"Loaded {tally.changes} votes of native poll {message.id}.")
+        return tally
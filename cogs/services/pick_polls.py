@@ -0,0 +1,237 @@
+import re
+import logging
+
+import discord
+
+
+logger = logging.getLogger(__name__)
+
+
+class PickPoll(object):
+    """
+    Etat des votes d'un sondage pick (une option par date), conserve en memoire et rendu dans l'embed du message
+    du sondage. Chaque membre recoit un bit, et les votes d'une option sont un masque de bits : un vote est applique
+    en temps constant, et la recherche d'une date commune se fait en un ET et un comptage de bits par option.
+    Les membres invites sont figes a la creation du sondage ; les autres votants recoivent un bit a leur premier vote
+    mais ne comptent pas dans le consensus.
+    """
+    MENTION_REGEX = re.compile(r'<@!?(\d+)>')
+
+    def __init__(self, message_id, channel_id, guild_id, role_name, embed_data, options, members, masks=None,
+                 send_reminders=True, created_at=None, last_reminder_at=None, total=None, buttons=False):
+        """
+        :param message_id: Identifiant du message du sondage
+        :param channel_id: Identifiant du channel du sondage
+        :param guild_id: Identifiant de la guilde du sondage
+        :param role_name: Nom du role invite au sondage
+        :param embed_data: Embed du sondage, sans ses champs (titre, auteur, couleur)
+        :param options: Libelles des options, dans l'ordre des emojis
+        :param members: Identifiants des membres invites, dans l'ordre de leurs bits
+        :param masks: Masque des votants de chaque option
+        :param send_reminders: Si True, des rappels sont envoyes aux membres n'ayant pas vote
+        :param created_at: Timestamp de creation du sondage
+        :param last_reminder_at: Timestamp du dernier rappel envoye
+        :param total: Nombre de membres invites (les premiers de `members`), tous les membres si None
+        :param buttons: Si True, les votes se font par boutons plutot que par reactions
+        """
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.role_name = role_name
+        self.embed_data = embed_data
+        self.options = options
+        self.members = list(dict.fromkeys(members))
+        self.index = {member_id: bit for bit, member_id in enumerate(self.members)}
+        self.total = len(self.members) if total is None else total
+        self.eligible = (1 << self.total) - 1
+        self.masks = masks or [0] * len(options)
+        self.send_reminders = send_reminders
+        self.created_at = created_at
+        self.last_reminder_at = last_reminder_at
+        self.buttons = buttons
+
+    def bit(self, user_id):
+        """
+        Retourne le bit d'un votant, en lui en attribuant un nouveau s'il n'en a pas encore.
+        :param user_id: Identifiant du votant
+        :return: Masque du votant
+        """
+        if user_id not in self.index:
+            self.index[user_id] = len(self.members)
+            self.members.append(user_id)
+        return 1 << self.index[user_id]
+
+    def add_vote(self, index, user_id):
+        self.masks[index] |= self.bit(user_id)
+
+    def remove_vote(self, index, user_id):
+        if user_id in self.index:
+            self.masks[index] &= ~(1 << self.index[user_id])
+
+    def toggle_vote(self, index, user_id):
+        """
+        Ajoute le vote d'un votant pour une option, ou le retire s'il avait deja vote pour elle.
+        :param index: Index de l'option
+        :param user_id: Identifiant du votant
+        :return: True si le vote a ete ajoute
+        """
+        self.masks[index] ^= self.bit(user_id)
+        return bool(self.masks[index] & self.bit(user_id))
+
+    def votes(self, index):
+        return (self.masks[index] & self.eligible).bit_count()
+
+    def voters(self, mask):
+        """
+        :param mask: Masque de votants
+        :return: Identifiants des votants du masque, dans l'ordre de leurs bits
+        """
+        voters = []
+        while mask:
+            low = mask & -mask
+            voters.append(self.members[low.bit_length() - 1])
+            mask ^= low
+        return voters
+
+    def consensus(self, missing=0):
+        """
+        Cherche les options choisies par tous les membres invites, a `missing` absents pres.
+        :param missing: Nombre d'absents toleres
+        :return: Index des options retenues, dans l'ordre
+        """
+        if not self.total:
+            return []
+        return [i for i, mask in enumerate(self.masks) if self.total - (mask & self.eligible).bit_count() <= missing]
+
+    def date_found(self):
+        """
+        Cherche une option choisie par tous les membres invites.
+        :return: Index de l'option, ou None
+        """
+        return next(iter(self.consensus()), None)
+
+    def best_dates(self, limit=3):
+        """
+        Classe les options ayant au moins un vote par nombre d'absents croissant (consensus partiel).
+        :param limit: Nombre d'options retournees
+        :return: Liste de tuples (libelle de l'option, nombre d'absents)
+        """
+        counts = [(self.total - self.votes(i), i) for i in range(len(self.options)) if self.votes(i)]
+        return [(self.options[i], missing) for missing, i in sorted(counts)[:limit]]
+
+    def non_voters(self):
+        """
+        :return: Identifiants des membres invites n'ayant vote pour aucune option
+        """
+        voted = 0
+        for mask in self.masks:
+            voted |= mask
+        return self.voters(self.eligible & ~voted)
+
+    def render(self):
+        """
+        Construit l'embed du sondage a partir de l'etat des votes.
+        :return: Embed du sondage
+        """
+        embed = discord.Embed.from_dict(dict(self.embed_data))
+        for i, option in enumerate(self.options):
+            value = f'Votes: {self.votes(i)}/{self.total}'
+            if self.masks[i]:
+                value += '\n' + ' '.join(f'<@{user_id}>' for user_id in self.voters(self.masks[i]))
+            embed.add_field(name=option, value=value, inline=True)
+        return embed
+
+    def to_record(self):
+        """
+        :return: Dictionnaire des informations du sondage, au format de la table `pick_polls`
+        """
+        return {
+            'message_id': self.message_id,
+            'guild_id': self.guild_id,
+            'channel_id': self.channel_id,
+            'role_name': self.role_name,
+            'embed': self.embed_data,
+            'options': self.options,
+            'members': self.members,
+            'total': self.total,
+            'masks': self.masks,
+            'send_reminders': self.send_reminders,
+            'created_at': self.created_at,
+            'last_reminder_at': self.last_reminder_at,
+            'buttons': self.buttons,
+        }
+
+    async def sync_reactions(self, message, emojis):
+        """
+        Remplace les votes par ceux lus dans les reactions du message du sondage. Les reactions sont toutes lues
+        avant que les votes ne soient remplaces.
+        :param message: Message du sondage
+        :param emojis: Emojis des options, dans l'ordre
+        :return:
+        """
+        options = emojis[:len(self.options)]
+        votes = []
+        for reaction in message.reactions:
+            if str(reaction.emoji) in options:
+                index = options.index(str(reaction.emoji))
+                async for user in reaction.users():
+                    if not user.bot:
+                        votes.append((index, user.id))
+        self.masks = [0] * len(self.options)
+        for index, user_id in votes:
+            self.add_vote(index, user_id)
+
+    @classmethod
+    def from_record(cls, record):
+        """
+        Reconstruit l'etat d'un sondage a partir de sa ligne de la table `pick_polls`. Les bits des votes sans membre
+        correspondant (votants hors invites dont la liste n'avait pas ete enregistree) sont ignores.
+        :param record: Dictionnaire des informations du sondage
+        :return: Etat du sondage
+        """
+        known = (1 << len(record['members'])) - 1
+        return cls(record['message_id'], record['channel_id'], record['guild_id'], record['role_name'],
+                   record['embed'], record['options'], record['members'], [mask & known for mask in record['masks']],
+                   send_reminders=record['send_reminders'], created_at=record['created_at'],
+                   last_reminder_at=record['last_reminder_at'], total=record['total'], buttons=record['buttons'])
+
+    @classmethod
+    def from_embed(cls, message, role_name, embed, members, send_reminders=True, buttons=False):
+        """
+        Construit l'etat d'un sondage a partir de son embed.
+        :param message: Message du sondage
+        :param role_name: Nom du role invite au sondage
+        :param embed: Embed du sondage
+        :param members: Identifiants des membres invites
+        :param send_reminders: Si True, des rappels sont envoyes aux membres n'ayant pas vote
+        :param buttons: Si True, les votes se font par boutons plutot que par reactions
+        :return: Etat du sondage
+        """
+        embed_data = embed.to_dict()
+        embed_data.pop('fields', None)
+        options = [field.name for field in embed.fields]
+        return cls(message.id, message.channel.id, message.guild.id, role_name, embed_data, options, members,
+                   send_reminders=send_reminders, created_at=message.created_at.timestamp(), buttons=buttons)
+
+    @classmethod
+    async def from_message(cls, message, role_name, emojis, send_reminders=True):
+        """
+        Reconstruit l'etat d'un sondage a partir de son message : les membres invites sont ceux mentionnes dans le
+        message, les votes sont lus dans ses reactions, ou dans les mentions de son embed s'il se vote par boutons.
+        :param message: Message du sondage
+        :param role_name: Nom du role invite au sondage
+        :param emojis: Emojis des options, dans l'ordre
+        :param send_reminders: Si True, des rappels sont envoyes aux membres n'ayant pas vote
+        :return: Etat du sondage
+        """
+        embed = message.embeds[0]
+        buttons = bool(message.components)
+        poll = cls.from_embed(message, role_name, embed, message.raw_mentions, send_reminders, buttons)
+        if buttons:
+            for index, field in enumerate(embed.fields):
+                for user_id in cls.MENTION_REGEX.findall(field.value or ''):
+                    poll.add_vote(index, int(user_id))
+        else:
+            await poll.sync_reactions(message, emojis)
+        logger.info(f"Rebuilt vote state of pick poll {message.id} from its message.")
+        return poll
@@ -0,0 +1,157 @@
+import time
+import heapq
+import asyncio
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class PollScheduler(object):
+    """
+    Ordonnanceur des echeances des sondages, base sur un tas binaire (min-heap) de timestamps.
+    Chaque sondage a au plus une echeance par type : expiration, rappel et verification des votes pour les sondages
+    Framadate, rappel pour les sondages pick.
+    """
+    EXPIRE = 'expire'
+    REMINDER = 'reminder'
+    CHECK = 'check'
+    PICK_REMINDER = 'pick_reminder'
+    KINDS = (EXPIRE, REMINDER, CHECK, PICK_REMINDER)
+
+    COALESCE_WINDOW = 5  # secondes
+
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def schedule(self, poll_name, kind, due):
+        """
+        Programme (ou reprogramme) une echeance pour un sondage.
+        :param poll_name: Nom du sondage
+        :param kind: Type d'echeance (expire, reminder, check)
+        :param due: Timestamp de l'echeance
+        :return:
+        """
+        next_deadline = self.next_deadline()
+        self._deadlines[(poll_name, kind)] = due
+        heapq.heappush(self._heap, (due, poll_name, kind))
+        if next_deadline is None or due < next_deadline:
+            self._wakeup.set()
+
+    def cancel(self, poll_name, kind=None):
+        """
+        Annule les echeances d'un sondage. Les entrees du tas sont supprimees paresseusement.
+        :param poll_name: Nom du sondage
+        :param kind: Type d'echeance a annuler, toutes si None
+        :return:
+        """
+        for k in (kind,) if kind else self.KINDS:
+            self._deadlines.pop((poll_name, k), None)
+
+    def deadline(self, poll_name, kind):
+        """
+        Retourne l'echeance programmee d'un sondage.
+        :param poll_name: Nom du sondage
+        :param kind: Type d'echeance
+        :return: Timestamp de l'echeance, ou None si elle n'est pas programmee
+        """
+        return self._deadlines.get((poll_name, kind))
+
+    def pop_kind_before(self, kind, deadline, skip=()):
+        """
+        Retire les echeances d'un type programmees avant une date, pour les traiter en avance.
+        :param kind: Type d'echeance
+        :param deadline: Timestamp limite
+        :param skip: Noms des sondages dont les echeances sont conservees
+        :return: Noms des sondages concernes
+        """
+        names = [poll_name for (poll_name, k), due in self._deadlines.items()
+                 if k == kind and due <= deadline and poll_name not in skip]
+        for poll_name in names:
+            del self._deadlines[(poll_name, kind)]
+        return names
+
+    def next_deadline(self):
+        """
+        Retourne la prochaine echeance, en purgeant les entrees annulees ou reprogrammees.
+        :return: Timestamp de la prochaine echeance, ou None si rien n'est programme
+        """
+        while self._heap:
+            due, poll_name, kind = self._heap[0]
+            if self._deadlines.get((poll_name, kind)) == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now):
+        """
+        Retire toutes les echeances atteintes (a la fenetre de regroupement pres).
+        :param now: Timestamp courant
+        :return: Dictionnaire {nom du sondage: ensemble des types d'echeances atteintes}
+        """
+        due_polls = {}
+        while True:
+            due = self.next_deadline()
+            if due is None or due > now + self.COALESCE_WINDOW:
+                break
+            _, poll_name, kind = heapq.heappop(self._heap)
+            del self._deadlines[(poll_name, kind)]
+            due_polls.setdefault(poll_name, set()).add(kind)
+        return due_polls
+
+    async def wait(self):
+        """
+        Attend la prochaine echeance, ou un reveil si une echeance plus proche a ete programmee entre temps.
+        :return:
+        """
+        self._wakeup.clear()
+        due = self.next_deadline()
+        timeout = None if due is None else max(0.0, due - time.time())
+        logger.debug(f"Poll scheduler sleeping for {timeout} seconds.")
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class AdaptiveCheckInterval(object):
+    """
+    Intervalle de verification des votes propre a chaque sondage : minimal tant que des votes arrivent, double a
+    chaque verification sans activite jusqu'a un plafond, et revient au minimum quand l'activite reprend ou que
+    l'expiration du sondage approche.
+    """
+    MIN_INTERVAL = 60  # secondes
+    MAX_INTERVAL = 60 * 60  # secondes
+    BACKOFF_FACTOR = 2
+    EXPIRY_WINDOW = 2 * 60 * 60  # secondes
+
+    def __init__(self):
+        self.intervals = {}
+
+    def next_interval(self, poll_name, active, time_left=None):
+        """
+        Calcule l'intervalle avant la prochaine verification d'un sondage.
+        :param poll_name: Nom du sondage
+        :param active: True si de nouveaux votes ont ete detectes lors de la derniere verification
+        :param time_left: Secondes restantes avant l'expiration du sondage, si connues
+        :return: Intervalle en secondes
+        """
+        previous = self.intervals.get(poll_name)
+        if active or previous is None:
+            interval = self.MIN_INTERVAL
+        else:
+            interval = min(previous * self.BACKOFF_FACTOR, self.MAX_INTERVAL)
+        if time_left is not None and time_left <= self.EXPIRY_WINDOW:
+            interval = self.MIN_INTERVAL
+        if interval != previous:
+            logger.info(f"Check interval of poll {poll_name} set to {interval}s.")
+        self.intervals[poll_name] = interval
+        return interval
+
+    def forget(self, poll_name):
+        self.intervals.pop(poll_name, None)
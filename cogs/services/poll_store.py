@@ -0,0 +1,320 @@
+import os
+import json
+import sqlite3
+import logging
+from datetime import datetime
+
+
+logger = logging.getLogger(__name__)
+
+
+class PollStore(object):
+    """
+    Stockage des sondages suivis par le bot dans une base SQLite en mode WAL.
+    Chaque sondage Framadate est une ligne de la table `polls`, mise a jour individuellement ; les sondages pick
+    actifs (votes et date du dernier rappel) sont indexes dans la table `pick_polls`, et les messages prives en
+    attente d'envoi dans la table `dm_outbox`.
+    """
+    DB_PATH = 'cogs/temp/polls.db'
+    LEGACY_JSON_PATH = 'cogs/temp/polls.json'
+    SCHEMA_VERSION = 1
+
+    POLL_DATE_FORMAT = '%d/%m/%Y'
+    SQL_DATE_FORMAT = '%Y-%m-%d'
+
+    COLUMNS = {
+        'poll_name': 'TEXT PRIMARY KEY',
+        'guild_id': 'INTEGER',
+        'channel_id': 'INTEGER',
+        'role_id': 'INTEGER',
+        'message_id': 'INTEGER',
+        'creator_id': 'INTEGER',
+        'gm_name': 'TEXT',
+        'player_ids': 'TEXT',
+        'backend': 'TEXT',
+        'answers': 'TEXT',
+        'admin_url': 'TEXT',
+        'public_url': 'TEXT',
+        'jump_url': 'TEXT',
+        'control_token': 'TEXT',
+        'choices_count': 'INTEGER',
+        'players_count': 'INTEGER',
+        'send_reminders': 'INTEGER',
+        'reminder_count': 'INTEGER DEFAULT 0',
+        'created_at': 'TEXT',
+        'expire_at': 'TEXT',
+        'last_reminder_sent': 'TEXT',
+        'last_channel_notification': 'TEXT',
+    }
+    INDEXES = ('expire_at', 'last_reminder_sent', 'guild_id')
+    BOOLEAN_COLUMNS = ('send_reminders',)
+    POLL_JSON_COLUMNS = ('player_ids', 'answers')
+
+    PICK_COLUMNS = {
+        'message_id': 'INTEGER PRIMARY KEY',
+        'guild_id': 'INTEGER',
+        'channel_id': 'INTEGER',
+        'role_name': 'TEXT',
+        'embed': 'TEXT',
+        'options': 'TEXT',
+        'members': 'TEXT',
+        'total': 'INTEGER',
+        'masks': 'TEXT',
+        'send_reminders': 'INTEGER',
+        'created_at': 'REAL',
+        'last_reminder_at': 'REAL',
+        'buttons': 'INTEGER',
+    }
+    JSON_COLUMNS = ('embed', 'options', 'members', 'masks')
+    PICK_BOOLEAN_COLUMNS = ('send_reminders', 'buttons')
+
+    DM_COLUMNS = {
+        'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        'user_id': 'INTEGER',
+        'content': 'TEXT',
+        'batch': 'TEXT',
+        'attempts': 'INTEGER DEFAULT 0',
+        'created_at': 'REAL',
+    }
+
+    def __init__(self, db_path=DB_PATH, legacy_json_path=LEGACY_JSON_PATH):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.create_schema()
+        self.migrate_legacy_json(legacy_json_path)
+        logger.info(f"PollStore initialized on {db_path}.")
+
+    def create_schema(self):
+        """
+        Cree les tables des sondages et leurs index, et ajoute les colonnes manquantes si les tables existent deja.
+        :return:
+        """
+        with self.conn:
+            for table, columns in (('polls', self.COLUMNS), ('pick_polls', self.PICK_COLUMNS),
+                                   ('dm_outbox', self.DM_COLUMNS)):
+                definitions = ', '.join(f'{name} {definition}' for name, definition in columns.items())
+                self.conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ({definitions})')
+                existing = {row['name'] for row in self.conn.execute(f'PRAGMA table_info({table})')}
+                for name, definition in columns.items():
+                    if name not in existing:
+                        logger.info(f"Adding column {name} to {table} table.")
+                        self.conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+            for column in self.INDEXES:
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS idx_polls_{column} ON polls ({column})')
+
+    def migrate_legacy_json(self, json_path):
+        """
+        Importe une seule fois les sondages de l'ancien fichier de suivi JSON.
+        :param json_path: Chemin de l'ancien fichier de suivi
+        :return:
+        """
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= self.SCHEMA_VERSION:
+            return
+
+        polls_data = {}
+        if json_path and os.path.exists(json_path):
+            with open(json_path, 'r') as file:
+                try:
+                    polls_data = json.load(file)
+                except json.JSONDecodeError:
+                    logger.error(f"Failed to load legacy polls data from {json_path}, nothing to migrate.")
+
+        with self.conn:
+            for poll_name, poll_data in polls_data.items():
+                poll_data.setdefault('poll_name', poll_name)
+                self._insert(poll_data)
+            self.conn.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+        logger.info(f"Migrated {len(polls_data)} polls from {json_path}.")
+
+    def _to_row(self, poll_data):
+        """
+        Convertit les informations d'un sondage au format stocke en base.
+        :param poll_data: Dictionnaire contenant les informations du sondage
+        :return: Dictionnaire des colonnes a ecrire
+        """
+        row = {}
+        for key, value in poll_data.items():
+            if key not in self.COLUMNS:
+                logger.warning(f"Unknown poll field {key}, ignored.")
+                continue
+            if key == 'expire_at' and value:
+                value = datetime.strptime(value, self.POLL_DATE_FORMAT).strftime(self.SQL_DATE_FORMAT)
+            elif key in self.BOOLEAN_COLUMNS and value is not None:
+                value = int(value in (True, 'True', 'true', 1))
+            elif key in self.POLL_JSON_COLUMNS and value is not None:
+                value = json.dumps(value)
+            row[key] = value
+        return row
+
+    def _from_row(self, row):
+        """
+        Convertit une ligne de la base au format utilise par le cog Event.
+        :param row: Ligne SQLite
+        :return: Dictionnaire contenant les informations du sondage
+        """
+        poll_data = dict(row)
+        if poll_data.get('expire_at'):
+            poll_data['expire_at'] = (datetime.strptime(poll_data['expire_at'], self.SQL_DATE_FORMAT)
+                                      .strftime(self.POLL_DATE_FORMAT))
+        for key in self.BOOLEAN_COLUMNS:
+            if poll_data.get(key) is not None:
+                poll_data[key] = bool(poll_data[key])
+        for key in self.POLL_JSON_COLUMNS:
+            if poll_data.get(key) is not None:
+                poll_data[key] = json.loads(poll_data[key])
+        return poll_data
+
+    def _insert(self, poll_data):
+        row = self._to_row(poll_data)
+        placeholders = ', '.join('?' for _ in row)
+        self.conn.execute(f'INSERT OR REPLACE INTO polls ({", ".join(row)}) VALUES ({placeholders})',
+                          tuple(row.values()))
+
+    def add(self, poll_data):
+        """
+        Ajoute (ou remplace) un sondage.
+        :param poll_data: Dictionnaire contenant les informations du sondage, indexe par 'poll_name'
+        :return:
+        """
+        logger.info(f"Storing poll {poll_data['poll_name']}.")
+        with self.conn:
+            self._insert(poll_data)
+
+    def get(self, poll_name):
+        """
+        Recupere un sondage.
+        :param poll_name: Nom du sondage
+        :return: Dictionnaire contenant les informations du sondage, ou None s'il n'est pas suivi
+        """
+        row = self.conn.execute('SELECT * FROM polls WHERE poll_name = ?', (poll_name,)).fetchone()
+        return self._from_row(row) if row else None
+
+    def all(self):
+        """
+        Recupere tous les sondages suivis.
+        :return: Liste des sondages
+        """
+        return [self._from_row(row) for row in self.conn.execute('SELECT * FROM polls')]
+
+    def _update(self, poll_name, fields):
+        row = self._to_row(fields)
+        if not row:
+            return
+        assignments = ', '.join(f'{key} = ?' for key in row)
+        self.conn.execute(f'UPDATE polls SET {assignments} WHERE poll_name = ?', (*row.values(), poll_name))
+
+    def apply(self, updates, removals):
+        """
+        Applique un lot de mises a jour et de suppressions dans une seule transaction.
+        :param updates: Dictionnaire {nom du sondage: colonnes a mettre a jour}
+        :param removals: Noms des sondages a supprimer
+        :return:
+        """
+        if not updates and not removals:
+            return
+        logger.info(f"Committing {len(updates)} poll updates and {len(removals)} removals.")
+        with self.conn:
+            for poll_name, fields in updates.items():
+                if poll_name not in removals:
+                    self._update(poll_name, fields)
+            self.conn.executemany('DELETE FROM polls WHERE poll_name = ?', [(name,) for name in removals])
+
+    def _to_pick_row(self, fields):
+        row = {}
+        for key, value in fields.items():
+            if key not in self.PICK_COLUMNS:
+                logger.warning(f"Unknown pick poll field {key}, ignored.")
+                continue
+            if key in self.JSON_COLUMNS:
+                value = json.dumps(value)
+            elif key in self.PICK_BOOLEAN_COLUMNS and value is not None:
+                value = int(bool(value))
+            row[key] = value
+        return row
+
+    def _from_pick_row(self, row):
+        record = dict(row)
+        for key in self.JSON_COLUMNS:
+            record[key] = json.loads(record[key]) if record[key] else None
+        for key in self.PICK_BOOLEAN_COLUMNS:
+            record[key] = bool(record[key])
+        return record
+
+    def add_pick_poll(self, record):
+        """
+        Ajoute (ou remplace) un sondage pick dans l'index des sondages actifs.
+        :param record: Dictionnaire des informations du sondage, indexe par 'message_id'
+        :return:
+        """
+        logger.info(f"Storing pick poll {record['message_id']}.")
+        row = self._to_pick_row(record)
+        placeholders = ', '.join('?' for _ in row)
+        with self.conn:
+            self.conn.execute(f'INSERT OR REPLACE INTO pick_polls ({", ".join(row)}) VALUES ({placeholders})',
+                              tuple(row.values()))
+
+    def pick_polls(self):
+        """
+        Recupere tous les sondages pick actifs.
+        :return: Liste des sondages
+        """
+        return [self._from_pick_row(row) for row in self.conn.execute('SELECT * FROM pick_polls')]
+
+    def update_pick_poll(self, message_id, **fields):
+        """
+        Met a jour certaines colonnes d'un sondage pick.
+        :param message_id: Identifiant du message du sondage
+        :param fields: Colonnes a mettre a jour
+        :return:
+        """
+        row = self._to_pick_row(fields)
+        if not row:
+            return
+        assignments = ', '.join(f'{key} = ?' for key in row)
+        with self.conn:
+            self.conn.execute(f'UPDATE pick_polls SET {assignments} WHERE message_id = ?', (*row.values(), message_id))
+
+    def remove_pick_poll(self, message_id):
+        """
+        Retire un sondage pick de l'index des sondages actifs.
+        :param message_id: Identifiant du message du sondage
+        :return:
+        """
+        logger.info(f"Removing pick poll {message_id} from store.")
+        with self.conn:
+            self.conn.execute('DELETE FROM pick_polls WHERE message_id = ?', (message_id,))
+
+    def enqueue_dms(self, messages, batch, created_at):
+        """
+        Enregistre un lot de messages prives a envoyer.
+        :param messages: Liste de tuples (identifiant du destinataire, contenu)
+        :param batch: Nom du lot
+        :param created_at: Timestamp de creation du lot
+        :return: Identifiants des messages enregistres, dans l'ordre
+        """
+        with self.conn:
+            return [self.conn.execute('INSERT INTO dm_outbox (user_id, content, batch, created_at) VALUES (?, ?, ?, ?)',
+                                      (user_id, content, batch, created_at)).lastrowid
+                    for user_id, content in messages]
+
+    def pending_dms(self):
+        """
+        Recupere les messages prives pas encore envoyes, dans l'ordre d'enregistrement.
+        :return: Liste des messages
+        """
+        return [dict(row) for row in self.conn.execute('SELECT * FROM dm_outbox ORDER BY id')]
+
+    def retry_dm(self, dm_id):
+        with self.conn:
+            self.conn.execute('UPDATE dm_outbox SET attempts = attempts + 1 WHERE id = ?', (dm_id,))
+
+    def remove_dm(self, dm_id):
+        with self.conn:
+            self.conn.execute('DELETE FROM dm_outbox WHERE id = ?', (dm_id,))
+
+    def close(self):
+        self.conn.close()
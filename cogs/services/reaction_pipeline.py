@@ -0,0 +1,59 @@
+import asyncio
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReactionPipeline(object):
+    """
+    File asynchrone des evenements de reaction, partitionnee par message. Les evenements d'un meme message sont
+    traites dans l'ordre par un seul worker, ceux de messages differents en parallele. Un worker attend un court
+    delai avant de traiter son lot, afin de regrouper une rafale de reactions en une seule mise a jour, puis
+    s'arrete des que sa file est vide.
+    """
+    DEBOUNCE_DELAY = 0.5  # secondes
+
+    def __init__(self, handler, debounce_delay=DEBOUNCE_DELAY):
+        """
+        :param handler: Coroutine appelee avec l'identifiant du message et la liste des evenements du lot
+        :param debounce_delay: Delai de regroupement des evenements d'un meme message, en secondes
+        """
+        self.handler = handler
+        self.debounce_delay = debounce_delay
+        self.queues = {}
+        self.workers = {}
+
+    def put(self, payload):
+        """
+        Ajoute un evenement de reaction a la file de son message, et demarre le worker du message si besoin.
+        :param payload: Evenement brut de reaction
+        :return:
+        """
+        message_id = payload.message_id
+        if message_id not in self.queues:
+            self.queues[message_id] = asyncio.Queue()
+        self.queues[message_id].put_nowait(payload)
+        if message_id not in self.workers:
+            self.workers[message_id] = asyncio.create_task(self.worker(message_id))
+
+    async def worker(self, message_id):
+        queue = self.queues[message_id]
+        try:
+            while not queue.empty():
+                await asyncio.sleep(self.debounce_delay)
+                batch = []
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+                logger.info(f"Processing {len(batch)} reaction events for message {message_id}.")
+                try:
+                    await self.handler(message_id, batch)
+                except Exception as e:
+                    logger.exception(f"Error while processing reactions for message {message_id}: {e}")
+        finally:
+            del self.workers[message_id]
+            del self.queues[message_id]
+
+    def cancel(self):
+        for worker in self.workers.values():
+            worker.cancel()
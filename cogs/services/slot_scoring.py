@@ -0,0 +1,80 @@
+import math
+import logging
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+class SlotScorer(object):
+    """
+    Classement vectorise des creneaux d'un sondage a partir de la matrice joueurs x creneaux des reponses.
+    Un creneau est retenu si assez de joueurs sont disponibles (quorum) et si les joueurs obligatoires (le MJ)
+    le sont ; les creneaux retenus sont classes par score, un "si nécessaire" comptant pour une fraction de "oui".
+    """
+    NO_ANSWER = 0
+    NO = 1
+    IF_NEEDED = 2
+    YES = 3
+
+    QUORUM = 1.0
+    IF_NEEDED_WEIGHT = 0.5
+    TOP_K = 3
+
+    def __init__(self, quorum=QUORUM, if_needed_weight=IF_NEEDED_WEIGHT, top_k=TOP_K):
+        """
+        :param quorum: Part des joueurs qui doivent etre disponibles sur un creneau (1.0 : tout le monde)
+        :param if_needed_weight: Poids d'un "si nécessaire" par rapport a un "oui"
+        :param top_k: Nombre de creneaux retournes
+        """
+        self.quorum = quorum
+        self.if_needed_weight = if_needed_weight
+        self.top_k = top_k
+
+    @staticmethod
+    def to_matrix(availability, slots_count):
+        """
+        Construit la matrice joueurs x creneaux a partir des lignes de codes de reponses.
+        :param availability: Dictionnaire {joueur: codes des reponses par creneau}
+        :param slots_count: Nombre de creneaux
+        :return: Matrice numpy de codes de reponses (uint8)
+        """
+        if not availability:
+            return np.zeros((0, slots_count), dtype=np.uint8)
+        return np.frombuffer(b''.join(availability.values()), dtype=np.uint8).reshape(len(availability),
+                                                                                      slots_count)
+
+    def rank(self, availability, slots, players_count, required=()):
+        """
+        Classe les creneaux en une seule passe vectorisee.
+        :param availability: Dictionnaire {joueur: codes des reponses par creneau}
+        :param slots: Libelles des creneaux
+        :param players_count: Nombre de joueurs attendus
+        :param required: Joueurs dont la disponibilite est obligatoire (ignores s'ils ne sont pas dans le sondage)
+        :return: Liste des meilleurs creneaux, du meilleur au moins bon, avec leur score et leurs decomptes
+        """
+        if not slots:
+            return []
+        matrix = self.to_matrix(availability, len(slots))
+        yes = matrix == self.YES
+        available = yes | (matrix == self.IF_NEEDED)
+
+        yes_counts = yes.sum(axis=0)
+        available_counts = available.sum(axis=0)
+        scores = yes_counts + self.if_needed_weight * (available_counts - yes_counts)
+
+        eligible = (available_counts >= math.ceil(self.quorum * players_count)) & (yes_counts > 0)
+        required_rows = np.isin(np.array(list(availability), dtype=object), list(required))
+        if required_rows.any():
+            eligible &= available[required_rows].all(axis=0)
+
+        order = np.lexsort((np.arange(len(slots)), -scores))
+        ranked = order[eligible[order]][:self.top_k]
+        return [{
+            'slot': slots[i],
+            'score': float(scores[i]),
+            'yes': int(yes_counts[i]),
+            'if_needed': int(available_counts[i] - yes_counts[i]),
+            'missing': int(players_count - available_counts[i]),
+        } for i in ranked]
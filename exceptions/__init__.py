@@ -9,6 +9,10 @@ class InvalidVoiceChannel(VoiceConnectionError):
     """Exception for cases of invalid Voice Channels."""
 
 
+class ExtractionQueueFull(commands.CommandError):
+    """Exception raised when too many yt-dlp extractions are already pending."""
+
+
 class BingImageLanguageError(Exception):
     """Exception returned if the language used for the Bing image creator is not English"""
     # def __init__(self, exception: Exception):
@@ -1,12 +1,13 @@
 import os
 import locale
-import aiohttp
 import logging
 from dotenv import load_dotenv
 
 import discord
 from discord.ext import commands, tasks
 
+from cogs.apis.http_session import PooledHTTPSession
+
 
 load_dotenv()
 locale.setlocale(locale.LC_ALL, 'fr_FR.utf8')
@@ -35,17 +36,30 @@ class MyBot(commands.Bot):
 
     async def setup_hook(self):
         self.background_task.start()
-        self.session = aiohttp.ClientSession()
+        self.session = PooledHTTPSession()
+        await self.session.start()
         for ext in self.initial_extensions:
             await self.load_extension(ext)
 
     async def close(self):
         await super().close()
-        await self.session.close()
+        if self.session:
+            await self.session.close()
 
     @tasks.loop(minutes=10)
     async def background_task(self):
         logging.info('Running background task...')  # Remplace print par logging
+        if self.session:
+            self.session.log_stats()
+        event = self.get_cog('Event')
+        if event:
+            event.log_reaction_stats()
+            event.outbox.log_stats()
+        music = self.get_cog('Music')
+        if music:
+            music.extractor.log_stats()
+            music.resolver.log_stats()
+            music.log_gap_stats()
 
     @staticmethod
     async def on_ready():